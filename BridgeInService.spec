@@ -10,11 +10,14 @@ a = Analysis(
     ('icon.jpg', '.'), 
     ('downarrow.png', '.')  
 ],
-    hiddenimports=['bridge_in_service_WIP_3'],
+    # openpyxl, win32com and pythoncom are imported on first use, list them so they are still bundled
+    hiddenimports=['bridge_in_service_WIP_3', 'openpyxl', 'win32com.client', 'pythoncom'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # The GUI never uses these, leaving them out keeps the onefile archive small and quick to unpack.
+    # openpyxl only uses numpy when it is installed.
+    excludes=['numpy', 'tkinter'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
@@ -1,21 +1,400 @@
 import sys
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLineEdit,
-                             QPushButton, QLabel, QFormLayout, QDateEdit, QTextEdit)
-from PyQt5.QtCore import QDate, QRegExp, Qt
-from PyQt5.QtGui import QRegExpValidator, QPixmap, QIcon
+                             QPushButton, QLabel, QFormLayout, QDateEdit, QTextEdit, QProgressBar,
+                             QTableView, QHeaderView, QAction, QCheckBox)
+from PyQt5.QtCore import QDate, QRegExp, Qt, QObject, QRunnable, QThreadPool, pyqtSignal, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QRegExpValidator, QPixmap, QIcon, QKeySequence, QColor
 from PyQt5.QtGui import QFontDatabase, QFont
-from bridge_in_service_WIP_3 import Employee, Calculation, DateOperations, Verification, Calculation, ExcelExport, Email
+from bridge_in_service_WIP_3 import Employee, Calculation, CalculationContext, DateOperations, Verification, Calculation, ExcelExport, Email
+from bridge_in_service_cache import ResultCache
+from bridge_in_service_months import MonthArithmetic
+from bridge_in_service_store import EmployeeStore
+from bridge_in_service_profiling import Profiler
 import datetime
+from itertools import zip_longest
 from dateutil.relativedelta import relativedelta
 import os
-from decimal import Decimal, getcontext
+from decimal import getcontext
+
+
+class WorkerCancelled(Exception):
+    pass
+
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """
+    Runs task(worker) on a QThreadPool thread and reports back through worker.signals, which are
+    delivered on the GUI thread. The task reports progress with report_progress and calls
+    check_cancelled between steps; a step that is already running (like a save to a network
+    share) finishes before the cancellation takes effect.
+    """
+
+    def __init__(self, task):
+        super().__init__()
+        self.task = task
+        self.signals = WorkerSignals()
+        self.cancel_requested = False
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def check_cancelled(self):
+        if self.cancel_requested:
+            raise WorkerCancelled()
+
+    def report_progress(self, percent, message):
+        self.check_cancelled()
+        self.signals.progress.emit(percent, message)
+
+    def run(self):
+        try:
+            result = self.task(self)
+        except WorkerCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+
+
+class AccrualTableModel(QAbstractTableModel):
+    """
+    The monthly accruals of a calculated employee, one row per month with the original and bridge
+    hours and FTE and the difference. The view only asks for the rows it shows, so decades of
+    months display at once, and rows sort by the numbers rather than their text.
+    """
+
+    HEADERS = ["Month", "Original Hours", "Original FTE", "Bridge Hours", "Bridge FTE", "Difference Hours"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.columns = [[] for _ in AccrualTableModel.HEADERS]  # Month ordinals, then hours and FTEs (None for no FTE)
+        self.order = []  # Row shown at each position, in the current sort order
+        self.sort_column = None
+        self.sort_order = Qt.AscendingOrder
+
+    def set_employee(self, employee):
+        """Show the monthly accruals of a calculated employee, keeping the current sort."""
+        original_monthly_accruals = employee.original_monthly_accruals
+        bridge_monthly_accruals = employee.bridge_monthly_accruals
+        months = list(employee.accrual_differences.months)
+        columns = [months, [], [], [], [], list(employee.accrual_differences.hours)]
+        for accruals, hours_column, fte_column in ((original_monthly_accruals, columns[1], columns[2]),
+                                                  (bridge_monthly_accruals, columns[3], columns[4])):
+            for month in months:
+                index = accruals.index_of(month)
+                hours_column.append(accruals.hours[index] if index is not None else 0.0)
+                fte_column.append(accruals.ftes[index] if index is not None else None)
+
+        self.beginResetModel()
+        self.columns = columns
+        self.order = self.sorted_rows(self.sort_column, self.sort_order)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(AccrualTableModel.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            value = self.columns[index.column()][self.order[index.row()]]
+            if index.column() == 0:
+                return MonthArithmetic.month_label(value)
+            return "" if value is None else f"{value:.2f}"
+        if role == Qt.TextAlignmentRole and index.column() > 0:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return AccrualTableModel.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def sorted_rows(self, column, order):
+
+        rows = range(len(self.columns[0]))
+        if column is None or column < 0:
+            return list(rows)
+        values = self.columns[column]
+        # Months without an FTE sort before any FTE, ties stay in month order
+        return sorted(rows, key=lambda row: (values[row] is not None, values[row] or 0), reverse=order == Qt.DescendingOrder)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column, self.sort_order = column, order
+        self.layoutAboutToBeChanged.emit()
+        # Keep the selection on the same months
+        persistent = self.persistentIndexList()
+        persistent_rows = [self.order[index.row()] for index in persistent]
+        self.order = self.sorted_rows(column, order)
+        positions = {row: position for position, row in enumerate(self.order)}
+        self.changePersistentIndexList(persistent, [self.index(positions[row], index.column())
+                                                    for row, index in zip(persistent_rows, persistent)])
+        self.layoutChanged.emit()
+
+
+class ClipboardTableView(QTableView):
+    """QTableView that copies the selected cells as tab-separated lines, which paste into Excel as cells."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        copy_action = QAction("Copy", self)
+        copy_action.setShortcut(QKeySequence.Copy)
+        copy_action.setShortcutContext(Qt.WidgetShortcut)
+        copy_action.triggered.connect(self.copy_selection)
+        self.addAction(copy_action)
+        self.setContextMenuPolicy(Qt.ActionsContextMenu)
+
+    def copy_selection(self):
+        indexes = self.selectionModel().selectedIndexes()
+        if not indexes:
+            return
+        rows = sorted({index.row() for index in indexes})
+        columns = sorted({index.column() for index in indexes})
+        cells = {(index.row(), index.column()): index.data() or "" for index in indexes}
+        QApplication.clipboard().setText("\n".join("\t".join(cells.get((row, column), "") for column in columns) for row in rows))
+
+
+class EmploymentHistoryModel(QAbstractTableModel):
+    """
+    Prior employment periods and FTE changes as one editable table in the roster layout, each row
+    holding a period, an FTE change or both. Cells keep the text typed or pasted, and the whole
+    table is checked after every change: invalid cells show in red with the reason as their
+    tooltip. Rows with every cell blank are ignored.
+    """
+
+    COLUMNS = ["Period Start", "Period End", "FTE Change Date", "New FTE"]
+    PERIOD_START, PERIOD_END, FTE_CHANGE_DATE, NEW_FTE = range(4)
+    DATE_COLUMNS = (PERIOD_START, PERIOD_END, FTE_CHANGE_DATE)
+    # Dates pasted from Excel or an HRIS export in these formats are stored as MM/DD/YYYY
+    DATE_FORMATS = ["%m/%d/%Y", "%Y-%m-%d"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.errors = {}  # (row, column) -> message
+        self.most_recent_start_date = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(EmploymentHistoryModel.COLUMNS)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.rows[index.row()][index.column()]
+        if role == Qt.ForegroundRole and (index.row(), index.column()) in self.errors:
+            return QColor("red")
+        if role == Qt.ToolTipRole:
+            return self.errors.get((index.row(), index.column()))
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return EmploymentHistoryModel.COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        self.set_cells({(index.row(), index.column()): value})
+        return True
+
+    @staticmethod
+    def cell_text(column, value):
+
+        text = str(value).strip() if value is not None else ""
+        if text and column in EmploymentHistoryModel.DATE_COLUMNS:
+            for date_format in EmploymentHistoryModel.DATE_FORMATS:
+                date = DateOperations.convert_to_datetime(text, date_format)
+                if date is not None:
+                    return date.strftime("%m/%d/%Y")
+        return text
+
+    def set_cells(self, cells):
+        """Set many cells at once, {(row, column): value}, then check the table once."""
+        if not cells:
+            return
+        for (row, column), value in cells.items():
+            self.rows[row][column] = EmploymentHistoryModel.cell_text(column, value)
+        rows = [row for row, _ in cells]
+        columns = [column for _, column in cells]
+        self.dataChanged.emit(self.index(min(rows), min(columns)), self.index(max(rows), max(columns)))
+        self.validate()
+
+    def add_rows(self, count=1):
+        """Append count blank rows and return the position of the first."""
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + count - 1)
+        self.rows.extend(["", "", "", ""] for _ in range(count))
+        self.endInsertRows()
+        return first
+
+    def remove_rows(self, rows):
+
+        for row in sorted(set(rows), reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.rows[row]
+            self.endRemoveRows()
+        self.validate()
+
+    def paste(self, row, column, lines):
+        """
+        Write clipboard lines (lists of cells, as copied from Excel) into the table from (row, column),
+        adding rows as needed. If the first line is column names, as in a roster, each pasted column
+        goes under its name instead. Cells beyond the last column are ignored.
+
+        Returns:
+        int: The number of rows pasted.
+        """
+        names = [name.lower() for name in EmploymentHistoryModel.COLUMNS]
+        header = [cell.strip().lower() for cell in lines[0]]
+        if all(cell in names for cell in header):
+            columns = [names.index(cell) for cell in header]
+            lines = lines[1:]
+        else:
+            columns = range(column, column + max(len(line) for line in lines))
+        if not lines:
+            return 0
+
+        missing = row + len(lines) - len(self.rows)
+        if missing > 0:
+            self.add_rows(missing)
+        self.set_cells({(row + offset, target): cell
+                        for offset, line in enumerate(lines)
+                        for target, cell in zip(columns, line) if target < len(names)})
+        return len(lines)
+
+    def set_history(self, employment_periods, fte_changes):
+        """Replace the table with (start_date, end_date) periods and (change_date, new_fte) changes."""
+        self.beginResetModel()
+        self.rows = []
+        for period, change in zip_longest(employment_periods, fte_changes):
+            start, end = (date.strftime("%m/%d/%Y") for date in period) if period else ("", "")
+            change_date, new_fte = (change[0].strftime("%m/%d/%Y"), str(change[1])) if change else ("", "")
+            self.rows.append([start, end, change_date, new_fte])
+        self.endResetModel()
+        self.validate()
+
+    def set_most_recent_start_date(self, most_recent_start_date):
+
+        self.most_recent_start_date = most_recent_start_date
+        self.validate()
+
+    def row_errors(self, start, end, change_date, new_fte):
+        """Return (column, message) for each invalid cell of one row."""
+        errors = []
+        if start or end:
+            start_date = DateOperations.convert_to_datetime(start)
+            end_date = DateOperations.convert_to_datetime(end)
+            for column, text, date in ((EmploymentHistoryModel.PERIOD_START, start, start_date),
+                                       (EmploymentHistoryModel.PERIOD_END, end, end_date)):
+                if date is None:
+                    errors.append((column, "Invalid date format. Please use MM/DD/YYYY." if text else "Please enter both period dates."))
+            if start_date is not None and end_date is not None:
+                if end_date < start_date:
+                    errors.append((EmploymentHistoryModel.PERIOD_END, "Period cannot end before it starts."))
+                elif self.most_recent_start_date is not None:
+                    valid, message = Verification.verify_employment_period_start(start_date, [], self.most_recent_start_date)
+                    if not valid:
+                        errors.append((EmploymentHistoryModel.PERIOD_START, message))
+
+        if change_date or new_fte:
+            valid, message = Verification.verify_date(change_date) if change_date else (False, "Please enter the FTE change date.")
+            if valid and self.most_recent_start_date is not None and DateOperations.convert_to_datetime(change_date) < self.most_recent_start_date:
+                valid, message = False, "FTE change cannot be before the most recent start date."
+            if not valid:
+                errors.append((EmploymentHistoryModel.FTE_CHANGE_DATE, message))
+            valid, message = Verification.verify_employee_fte(new_fte) if new_fte else (False, "Please enter the new FTE.")
+            if not valid:
+                errors.append((EmploymentHistoryModel.NEW_FTE, message))
+        return errors
+
+    def validate(self):
+        """Check every row, mark the invalid cells and return their messages (empty if the table is valid)."""
+        errors = {}
+        for row, cells in enumerate(self.rows):
+            for column, message in self.row_errors(*cells):
+                errors[(row, column)] = message
+        if errors != self.errors:
+            self.errors = errors
+            if self.rows:
+                self.dataChanged.emit(self.index(0, 0), self.index(len(self.rows) - 1, len(EmploymentHistoryModel.COLUMNS) - 1),
+                                      [Qt.ForegroundRole, Qt.ToolTipRole])
+        return [f"Row {row + 1} {EmploymentHistoryModel.COLUMNS[column]}: {message}" for (row, column), message in sorted(self.errors.items())]
+
+    def employment_periods(self):
+        """Return the entered periods as (start_date, end_date) datetimes, for a table that validated."""
+        return [(DateOperations.convert_to_datetime(start), DateOperations.convert_to_datetime(end))
+                for start, end, _, _ in self.rows if start or end]
+
+    def fte_changes(self):
+        """Return the entered FTE changes as (change_date, new_fte), for a table that validated."""
+        return [(DateOperations.convert_to_datetime(change_date), float(new_fte))
+                for _, _, change_date, new_fte in self.rows if change_date or new_fte]
+
+
+class EditableTableView(ClipboardTableView):
+    """
+    ClipboardTableView that also pastes tab-separated lines from Excel or an HRIS export into the
+    model from the current cell, and clears the selected cells with Delete. The model provides
+    paste(row, column, lines) and set_cells(cells), like EmploymentHistoryModel.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        for name, shortcut, slot in (("Paste", QKeySequence.Paste, self.paste_clipboard),
+                                     ("Clear", QKeySequence.Delete, self.clear_selection)):
+            action = QAction(name, self)
+            action.setShortcut(shortcut)
+            action.setShortcutContext(Qt.WidgetShortcut)
+            action.triggered.connect(slot)
+            self.addAction(action)
+
+    def paste_clipboard(self):
+        text = QApplication.clipboard().text().replace("\r\n", "\n").replace("\r", "\n")
+        lines = [line.split("\t") for line in text.split("\n")]
+        if lines and lines[-1] == [""]:
+            lines.pop()  # Excel ends a copy with a line break
+        if not lines:
+            return
+        current = self.currentIndex()
+        if current.isValid():
+            self.model().paste(current.row(), current.column(), lines)
+        else:
+            self.model().paste(self.model().rowCount(), 0, lines)
+
+    def clear_selection(self):
+        self.model().set_cells({(index.row(), index.column()): "" for index in self.selectionModel().selectedIndexes()})
+
 
 class EmployeeApp(QMainWindow):
+
     def __init__(self):
         super().__init__()
-        self.employment_periods = []
-        self.fte_changes = []
         self.employee = None
+        self.worker = None
+        self.thread_pool = QThreadPool.globalInstance()
+        # Accruals of earlier submits today, so submitting an unchanged employee again is instant
+        self.accrual_cache = ResultCache()
         self.initUI()
         self.applyStyle()
 
@@ -75,7 +454,7 @@ class EmployeeApp(QMainWindow):
             QPushButton:pressed {{
                 background-color: #003970;
             }}
-            QTextEdit, QScrollBar:vertical {{
+            QTextEdit, QTableView, QScrollBar:vertical {{
                 border: 1px solid #cccccc;
                 border-radius: 10px;
                 background: #ffffff;
@@ -113,6 +492,15 @@ class EmployeeApp(QMainWindow):
         employee_id_validator = QRegExpValidator(employee_id_regex, self.employee_id_input)
         self.employee_id_input.setValidator(employee_id_validator)
         self.employee_id_input.textChanged.connect(self.validate_employee_id)
+        self.employee_id_layout = QHBoxLayout()
+        self.load_employee_button = QPushButton("Load")
+        self.load_employee_button.clicked.connect(self.load_employee)
+        # Saving the employment history is opt-in, it is personal data kept on this machine
+        self.save_employee_checkbox = QCheckBox("Save on Submit")
+        self.save_employee_checkbox.setToolTip(f"Save the employee's employment history to {EmployeeStore.DEFAULT_PATH} so Load can bring it back")
+        self.employee_id_layout.addWidget(self.employee_id_input)
+        self.employee_id_layout.addWidget(self.load_employee_button)
+        self.employee_id_layout.addWidget(self.save_employee_checkbox)
         self.first_name_input = QLineEdit()
         self.last_name_input = QLineEdit()
         self.date_and_fte_layout = QHBoxLayout()
@@ -122,7 +510,7 @@ class EmployeeApp(QMainWindow):
         self.most_recent_start_date_input.setMinimumSize(120, 32) # Set a familiar format, adjust as needed
         six_months_ago = datetime.datetime.today() - relativedelta(months=6)  # Accurately move six months back
         self.most_recent_start_date_input.setDate(QDate(six_months_ago.year, six_months_ago.month, six_months_ago.day))
-        self.most_recent_start_date_input.dateChanged.connect(self.update_fte_change_dates)
+        self.most_recent_start_date_input.dateChanged.connect(self.update_history_start_date)
         self.fte_input = QLineEdit()
         fte_regex = QRegExp("^1(.0)?|\.75|\.76|\.77|\.78|\.79|\.8[0-9]|\.9[0-9]|0?\.[7-9][0-9]?$")
         fte_validator = QRegExpValidator(fte_regex, self.fte_input)
@@ -130,7 +518,7 @@ class EmployeeApp(QMainWindow):
         self.fte_input.textChanged.connect(self.validate_fte)
         self.date_and_fte_layout.addWidget(self.most_recent_start_date_input)
         self.date_and_fte_layout.addWidget(self.fte_input)
-        self.form_layout.addRow('Employee ID:', self.employee_id_input)
+        self.form_layout.addRow('Employee ID:', self.employee_id_layout)
         self.form_layout.addRow('First Name:', self.first_name_input)
         self.form_layout.addRow('Last Name:', self.last_name_input)
         self.form_layout.addRow('Most Recent Start Date and FTE:', self.date_and_fte_layout)
@@ -138,30 +526,32 @@ class EmployeeApp(QMainWindow):
         # Add the form layout to the main layout
         self.layout.addLayout(self.form_layout)
 
-        # Employment periods and FTE changes sections should be added next
-        self.periods_layout = QVBoxLayout()
-        self.employment_periods_title = QLabel("Employment Periods")
-        self.employment_periods_title.setStyleSheet("font-weight: bold; font-size: 14px")
-        self.employment_periods_title.setVisible(False)  # Initially hidden
-        self.employment_periods_title.setAlignment(Qt.AlignCenter)
-        self.layout.addWidget(self.employment_periods_title)
-        
-        
+        # Prior employment periods and FTE changes, typed or pasted from Excel into one table
+        self.history_title = QLabel("Employment Periods and FTE Changes")
+        self.history_title.setStyleSheet("font-weight: bold; font-size: 14px")
+        self.history_title.setAlignment(Qt.AlignCenter)
+        self.layout.addWidget(self.history_title)
+        self.history_model = EmploymentHistoryModel(self)
+        self.history_table = EditableTableView()
+        self.history_table.setModel(self.history_model)
+        self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.history_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.history_table.setMinimumHeight(150)
+        self.layout.addWidget(self.history_table)
+        self.update_history_start_date()
+
+        self.history_buttons_layout = QHBoxLayout()
         self.add_period_button = QPushButton("Add Employment Period")
         self.add_period_button.clicked.connect(self.add_employment_period)
-        self.periods_layout.addWidget(self.add_period_button)
-        self.layout.addLayout(self.periods_layout)
-
-        self.fte_changes_layout = QVBoxLayout()
-        self.fte_changes_title = QLabel("FTE Changes")
-        self.fte_changes_title.setStyleSheet("font-weight: bold; font-size: 14px")  # Styling the title
-        self.fte_changes_title.setVisible(False)  # Hide the title until the first change is added
-        self.fte_changes_title.setAlignment(Qt.AlignCenter)
-        self.fte_changes_layout.addWidget(self.fte_changes_title)
         self.add_fte_change_button = QPushButton("Add FTE Change")
         self.add_fte_change_button.clicked.connect(self.add_fte_change)
-        self.fte_changes_layout.addWidget(self.add_fte_change_button)
-        self.layout.addLayout(self.fte_changes_layout)
+        self.paste_history_button = QPushButton("Paste")
+        self.paste_history_button.clicked.connect(self.history_table.paste_clipboard)
+        self.delete_history_button = QPushButton("Delete Rows")
+        self.delete_history_button.clicked.connect(self.delete_history_rows)
+        for button in (self.add_period_button, self.add_fte_change_button, self.paste_history_button, self.delete_history_button):
+            self.history_buttons_layout.addWidget(button)
+        self.layout.addLayout(self.history_buttons_layout)
 
         self.export_to_excel_button = QPushButton("Export to Excel")
         self.export_to_excel_button.clicked.connect(self.export_to_excel)
@@ -176,98 +566,124 @@ class EmployeeApp(QMainWindow):
         self.submit_button.clicked.connect(self.submit_data)
         self.layout.addWidget(self.submit_button)
 
-        # Create a text edit field for displaying results
+        # Create a text edit field for displaying messages and the result totals
         self.result_display = QTextEdit()
         self.result_display.setReadOnly(True)
+        self.result_display.setMaximumHeight(120)
         self.layout.addWidget(self.result_display)
 
+        # Monthly accruals of the last calculated employee, sortable by any column and copyable
+        self.accrual_table_model = AccrualTableModel(self)
+        self.accrual_table = ClipboardTableView()
+        self.accrual_table.setModel(self.accrual_table_model)
+        self.accrual_table.setSortingEnabled(True)
+        self.accrual_table.sortByColumn(-1, Qt.AscendingOrder)  # Month order until a column is clicked
+        self.accrual_table.setAlternatingRowColors(True)
+        self.accrual_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # Fixed row heights, so the view never measures rows it does not show
+        self.accrual_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.accrual_table.verticalHeader().setVisible(False)
+        self.layout.addWidget(self.accrual_table)
+
+        # Progress of the calculation, export or email running in the background
+        self.progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_worker)
+        self.progress_layout.addWidget(self.progress_bar)
+        self.progress_layout.addWidget(self.cancel_button)
+        self.progress_bar.setVisible(False)
+        self.cancel_button.setVisible(False)
+        self.layout.addLayout(self.progress_layout)
+
+    def start_worker(self, message, task, on_finished):
+        """Run task(worker) in the thread pool and pass its result to on_finished on the GUI thread."""
+        self.worker = Worker(task)
+        self.worker.signals.progress.connect(self.show_progress)
+        self.worker.signals.finished.connect(on_finished)
+        self.worker.signals.failed.connect(lambda error: self.append_result(f"{message} failed: {error}"))
+        self.worker.signals.cancelled.connect(lambda: self.append_result(f"{message} cancelled."))
+        for signal in (self.worker.signals.finished, self.worker.signals.failed, self.worker.signals.cancelled):
+            signal.connect(self.worker_done)
+
+        # One task at a time, the form stays editable
+        for button in (self.submit_button, self.export_to_excel_button, self.send_email_button, self.load_employee_button):
+            button.setEnabled(False)
+        self.show_progress(0, message)
+        self.progress_bar.setVisible(True)
+        self.cancel_button.setVisible(True)
+        self.cancel_button.setEnabled(True)
+        self.thread_pool.start(self.worker)
+
+    def show_progress(self, percent, message):
+        self.progress_bar.setValue(percent)
+        self.progress_bar.setFormat(f"{message}... %p%")
+
+    def cancel_worker(self):
+        if self.worker:
+            self.worker.cancel()
+            self.cancel_button.setEnabled(False)
+
+    def worker_done(self, *args):
+        self.worker = None
+        for button in (self.submit_button, self.export_to_excel_button, self.send_email_button, self.load_employee_button):
+            button.setEnabled(True)
+        self.progress_bar.setVisible(False)
+        self.cancel_button.setVisible(False)
+
+    def append_result(self, result_msg):
+        current_text = self.result_display.toPlainText()
+        self.result_display.setText(current_text + "\n" + result_msg)
+
+    def closeEvent(self, event):
+        # Let a running task stop at its next step instead of holding up the exit
+        self.cancel_worker()
+        super().closeEvent(event)
+
     def add_employment_period(self):
-        if not self.employment_periods_title.isVisible():
-            self.employment_periods_title.setVisible(True)
-        start_date = QDateEdit()
-        start_date.setCalendarPopup(True)
-        end_date = QDateEdit()
-        end_date.setCalendarPopup(True)
-        remove_button = QPushButton('Delete')
-        period_layout = QHBoxLayout()
-        period_layout.addWidget(start_date)
-        period_layout.addWidget(end_date)
-        period_layout.addWidget(remove_button)
-        period_entry = {'start': start_date, 'end': end_date, 'layout': period_layout, 'button': remove_button}
-        self.employment_periods.append(period_entry)
-        self.periods_layout.insertLayout(self.periods_layout.count() - 1, period_layout)
-        remove_button.clicked.connect(lambda: self.remove_layout(period_entry, self.employment_periods, self.periods_layout))
+        self.edit_new_history_row(EmploymentHistoryModel.PERIOD_START)
 
     def add_fte_change(self):
-        if not self.fte_changes_title.isVisible():
-            self.fte_changes_title.setVisible(True)
+        self.edit_new_history_row(EmploymentHistoryModel.FTE_CHANGE_DATE)
 
-        change_date = QDateEdit()
-        change_date.setCalendarPopup(True)
-        most_recent_date = self.most_recent_start_date_input.date()
-        change_date.setDate(most_recent_date)
-        change_date.setMinimumDate(most_recent_date)
+    def edit_new_history_row(self, column):
+        index = self.history_model.index(self.history_model.add_rows(), column)
+        self.history_table.setCurrentIndex(index)
+        self.history_table.edit(index)
 
-        new_fte = QLineEdit()
-        fte_regex = QRegExp("^1(.0)?|\.75|\.76|\.77|\.78|\.79|\.8[0-9]|\.9[0-9]|0?\.[7-9][0-9]?$")
-        fte_validator = QRegExpValidator(fte_regex, new_fte)
-        new_fte.setValidator(fte_validator)
-        new_fte.textChanged.connect(self.validate_fte)
-
-        remove_button = QPushButton('Delete')
-        fte_layout = QHBoxLayout()
-        fte_layout.addWidget(change_date)
-        fte_layout.addWidget(new_fte)
-        fte_layout.addWidget(remove_button)
-
-        fte_change_entry = {'date': change_date, 'fte': new_fte, 'layout': fte_layout, 'button': remove_button}
-        self.fte_changes.append(fte_change_entry)
-        self.fte_changes_layout.insertLayout(self.fte_changes_layout.count() - 1, fte_layout)
-        remove_button.clicked.connect(lambda: self.remove_layout(fte_change_entry, self.fte_changes, self.fte_changes_layout))
-
-
-    def get_latest_fte_change_date(self):
-        """Return the maximum date set in FTE changes or the most recent start date if no FTE changes exist."""
-        if self.fte_changes:
-            return max(entry['date'].date() for entry in self.fte_changes)
-        else:
-            return self.most_recent_start_date_input.date()
-        
-    def set_fte_change_date(self, change_date):
-        most_recent_date = self.most_recent_start_date_input.date()
-        change_date.setDate(most_recent_date)
-        change_date.setMinimumDate(most_recent_date)
-
-    def update_fte_change_dates(self):
-        """Update all FTE change dates to reflect the most recent start date or to ensure correct order."""
-        most_recent_date = self.most_recent_start_date_input.date()
-        if self.fte_changes:
-            for entry in self.fte_changes:
-                change_date = entry['date']
-                current_date = change_date.date()
-                change_date.setMinimumDate(most_recent_date)
-                if current_date < most_recent_date:
-                    change_date.setDate(most_recent_date)  # Update the date if it's earlier than the most recent start date
-
-
-
-    def remove_layout(self, entry, list_reference, layout_reference):
-        # Deleting the widgets from the layout and the list
-        entry.get('start', entry.get('date')).deleteLater()
-        entry.get('end', entry.get('fte')).deleteLater()
-        entry['button'].deleteLater()
-        layout_reference.removeItem(entry['layout'])
-        list_reference.remove(entry)
-
-        # Check if the list is empty after removal and adjust the title visibility specifically
-        if not list_reference:
-            if list_reference is self.employment_periods:
-                self.employment_periods_title.setVisible(False)  # Hide the employment periods title if no periods are left
-            elif list_reference is self.fte_changes:
-                self.fte_changes_title.setVisible(False)  # Hide the FTE changes title if no changes are left
-
-        # Recompute layout after removal to ensure updates are visible
-        layout_reference.update()
+    def delete_history_rows(self):
+        self.history_model.remove_rows(index.row() for index in self.history_table.selectionModel().selectedIndexes())
+
+    def update_history_start_date(self):
+        """Check the periods and FTE changes against the most recent start date as it changes."""
+        most_recent_start_date = self.most_recent_start_date_input.date().toString("MM/dd/yyyy")
+        self.history_model.set_most_recent_start_date(DateOperations.convert_to_datetime(most_recent_start_date))
+
+    def load_employee(self):
+        """Fill the form with an employee saved by a previous submit."""
+        employee_id = self.employee_id_input.text()
+        try:
+            with EmployeeStore() as store:
+                employee = store.load_employee(employee_id)
+        except Exception as e:
+            self.result_display.setText(f"Failed to load employee: {e}")
+            return
+        if employee is None:
+            self.result_display.setText(f"No saved employee with ID {employee_id}.")
+            return
+
+        self.first_name_input.setText(employee.first_name)
+        self.last_name_input.setText(employee.last_name)
+        start = employee.most_recent_start_date
+        self.most_recent_start_date_input.setDate(QDate(start.year, start.month, start.day))
+        self.fte_input.setText(str(employee.fte_changes[0][1]))
+
+        # Replace the rows on the form with the saved periods and FTE changes
+        # The first period is the current one and the first change is the initial FTE
+        self.history_model.set_history(employee.prior_employment_periods[1:], employee.fte_changes[1:])
+
+        self.result_display.setText(f"Loaded {employee.first_name} {employee.last_name}.")
 
     def submit_data(self):
         getcontext().prec = 28
@@ -281,81 +697,98 @@ class EmployeeApp(QMainWindow):
         valid_id, id_msg = Verification.verify_employee_id(employee_id)
         valid_date, date_msg = Verification.verify_most_recent_start_date(most_recent_start_date)
         valid_fte, fte_msg = Verification.verify_employee_fte(fte)
-        
-        if not valid_id or not valid_date or not valid_fte:
-            validation_message = "\n".join([id_msg, date_msg, fte_msg])
+        history_messages = self.history_model.validate()
+
+        if not valid_id or not valid_date or not valid_fte or history_messages:
+            validation_message = "\n".join([id_msg, date_msg, fte_msg] + history_messages)
             self.result_display.setText("Validation Failed:\n" + validation_message)
             return
 
         # Create Employee instance if validations pass
         dt_most_recent_start_date = DateOperations.convert_to_datetime(most_recent_start_date)
-        self.employee = Employee(employee_id, first_name, last_name, dt_most_recent_start_date, float(fte))
-
-        # Handle employment periods from the GUI
-        for period in self.employment_periods:
-            start = period['start'].date().toString("MM/dd/yyyy")
-            end = period['end'].date().toString("MM/dd/yyyy")
-            self.employee.add_employment_period(DateOperations.convert_to_datetime(start), DateOperations.convert_to_datetime(end))
-
-        # Handle FTE changes from the GUI, ensuring no empty or invalid entries are used
-        for change in self.fte_changes:
-            change_date = change['date'].date().toString("MM/dd/yyyy")
-            new_fte = change['fte'].text().strip()
-            if new_fte:  # Check if the FTE field is not empty
-                is_valid, _ = Verification.verify_employee_fte(new_fte)  # Optionally check for validity
-                if is_valid:
-                    self.employee.add_fte_change(DateOperations.convert_to_datetime(change_date), float(new_fte))
-
-        # Perform calculations
-        bridge_in_service_date = Calculation.calculate_bridge_in_service_date(self.employee)
-        original_pto_accrued, original_monthly_accruals = Calculation.calculate_pto_accrual_rate(self.employee)
-        bridge_pto_accrued, bridge_monthly_accruals = Calculation.calculate_bridge_pto_accrual_rate(self.employee)
-        accrual_differences = Calculation.calculate_accrual_differences(original_monthly_accruals, bridge_monthly_accruals)
-        # Store accrual details in the employee object
-        self.employee.original_monthly_accruals = original_monthly_accruals
-        self.employee.bridge_monthly_accruals = bridge_monthly_accruals
-        self.employee.accrual_differences = accrual_differences
-
-        # Accumulate totals
-        # Convert strings to Decimals and sum them up
-        total_original = sum(Decimal(details.split()[0]) for details in original_monthly_accruals.values())
-        total_bridge = sum(Decimal(details.split()[0]) for details in bridge_monthly_accruals.values())
-        total_difference = (total_bridge - total_original).quantize(Decimal('0.00'))
-        self.employee.update_pto_accrual_difference(total_difference)
-
-        # Prepare results display
-        result_text = f"Processed data for {first_name} {last_name}:<br>"
-        result_text += f"Bridge in Service Date: {bridge_in_service_date.strftime('%m/%d/%Y')}<br>"
-        result_text += f"PTO to Add: {total_difference:.2f} hours<br><br>"
-        result_text += "<table border='1'><tr><th>Month Year</th><th>Original</th><th>Bridge</th><th>Difference</th></tr>"
-
-        for month in accrual_differences:
-            result_text += f"<tr><td>{month}</td><td>{original_monthly_accruals.get(month, '0.00 Hours')}</td><td>{bridge_monthly_accruals.get(month, '0.00 Hours')}</td><td>{accrual_differences[month]}</td></tr>"
-
-        result_text += f"<tr style='font-weight:bold;'><td>Total</td><td>{total_original:.2f} Hours</td><td>{total_bridge:.2f} Hours</td><td>{total_difference:.2f} Hours</td></tr>"
-        result_text += "</table>"
-        self.result_display.setHtml(result_text)
+        employee = Employee(employee_id, first_name, last_name, dt_most_recent_start_date, float(fte))
+
+        # Handle employment periods and FTE changes from the GUI, the table validated above
+        for start_date, end_date in self.history_model.employment_periods():
+            employee.add_employment_period(start_date, end_date)
+        for change_date, new_fte in self.history_model.fte_changes():
+            employee.add_fte_change(change_date, new_fte)
+
+        accrual_cache = self.accrual_cache
+        save = self.save_employee_checkbox.isChecked()
+        self.start_worker("Calculating", lambda worker: EmployeeApp.calculate_employee_task(worker, employee, accrual_cache, save), self.show_results)
+
+    @staticmethod
+    def calculate_employee_task(worker, employee, accrual_cache, save=False):
+        # Perform calculations and store the accrual details in the employee object
+        worker.report_progress(10, "Calculating")
+        with CalculationContext(accrual_cache=accrual_cache).activate():
+            total_original, total_bridge, total_difference = Calculation.calculate_employee(employee)
+
+        # If asked to, save the employee so the history does not have to be entered again next time
+        save_message = None
+        if save:
+            worker.report_progress(60, "Saving employee")
+            try:
+                with EmployeeStore() as store:
+                    store.save_employee(employee)
+                save_message = f"Saved to {EmployeeStore.DEFAULT_PATH}."
+            except Exception as e:
+                # Shown with the results, the windowed build has no console for a print
+                save_message = f"Failed to save employee: {e}. The history will not load next time."
+
+        # Prepare results display, the monthly rows are read from the employee by the table model
+        worker.report_progress(90, "Preparing results")
+        return employee, EmployeeApp.results_summary(employee, total_original, total_bridge, total_difference), save_message
+
+    def show_results(self, result):
+        self.employee, result_text, save_message = result
+        self.result_display.setText(result_text if save_message is None else f"{result_text}\n{save_message}")
+        self.accrual_table_model.set_employee(self.employee)
+
+    @staticmethod
+    def results_summary(employee, total_original, total_bridge, total_difference):
+        return "\n".join([
+            f"Processed data for {employee.first_name} {employee.last_name}:",
+            f"Bridge in Service Date: {employee.bridge_in_service_date.strftime('%m/%d/%Y')}",
+            f"PTO to Add: {total_difference:.2f} hours",
+            f"Total: Original {total_original:.2f} Hours, Bridge {total_bridge:.2f} Hours, Difference {total_difference:.2f} Hours"
+        ])
 
     def export_to_excel(self):
         if self.employee:
-            # Assume directory and employee setup already provided
-            success = ExcelExport.try_export_employee_data(
-                self.employee,
-                "C:\\Hospital HR\\Operations\\VOE (Letters, Completed VOEs, etc)\\Bridge in Service",
-                self.employee.original_monthly_accruals,
-                self.employee.bridge_monthly_accruals,
-                self.employee.accrual_differences
-            )
-            result_msg = 'Excel file exported successfully.' if success else 'Failed to export to Excel.'
-            current_text = self.result_display.toPlainText()
-            self.result_display.setText(current_text + "\n" + result_msg)
+            employee = self.employee
+            self.start_worker("Exporting to Excel", lambda worker: EmployeeApp.export_task(worker, employee),
+                              lambda success: self.append_result('Excel file exported successfully.' if success else 'Failed to export to Excel.'))
+
+    @staticmethod
+    def export_task(worker, employee):
+        # The save can take a while when the HR share is slow, it runs off the GUI thread
+        worker.report_progress(20, "Exporting to Excel")
+        return ExcelExport.try_export_employee_data(
+            employee,
+            ExcelExport.DEFAULT_DIRECTORY,
+            employee.original_monthly_accruals,
+            employee.bridge_monthly_accruals,
+            employee.accrual_differences
+        )
 
     def send_email(self):
         if self.employee:
-            success = Email.try_send_email(self.employee)
-            result_msg = 'Email opened successfully.' if success else 'Failed to open email.'
-            current_text = self.result_display.toPlainText()
-            self.result_display.setText(current_text + "\n" + result_msg)
+            employee = self.employee
+            self.start_worker("Opening email", lambda worker: EmployeeApp.email_task(worker, employee),
+                              lambda success: self.append_result('Email opened successfully.' if success else 'Failed to open email.'))
+
+    @staticmethod
+    def email_task(worker, employee):
+        worker.report_progress(20, "Opening email")
+        # Each thread using Outlook through COM has to initialize COM itself
+        import pythoncom
+        pythoncom.CoInitialize()
+        try:
+            return Email.try_send_email(employee)
+        finally:
+            pythoncom.CoUninitialize()
 
     def validate_employee_id(self, text):
         if not text:  # Check if the text field is empty
@@ -384,7 +817,16 @@ class EmployeeApp(QMainWindow):
                 self.result_display.setText(message)
 
 
+# Stages timed while profiling is enabled, see Profiler in bridge_in_service_profiling
+Profiler.register(AccrualTableModel, "set_employee", "results_table")
+Profiler.register(EmploymentHistoryModel, "validate", "history_validation")
+
+
 if __name__ == "__main__":
+    # Set BRIDGE_IN_SERVICE_PROFILE to a file path to write a Chrome trace of the session on exit
+    profile_path = os.environ.get("BRIDGE_IN_SERVICE_PROFILE")
+    if profile_path:
+        Profiler.enable(trace=True)
     app = QApplication(sys.argv)
     id = QFontDatabase.addApplicationFont(EmployeeApp.resource_path('Roboto-Regular.ttf'))
     if id != -1:
@@ -393,4 +835,9 @@ if __name__ == "__main__":
         app.setFont(app_font)
     ex = EmployeeApp()
     ex.show()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    if profile_path:
+        stats = Profiler.disable()
+        print(stats.report())
+        stats.try_write_chrome_trace(profile_path)
+    sys.exit(exit_code)
@@ -1,16 +1,121 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
-import calendar
-import openpyxl
-import win32com.client as win32
+import bisect
+import io
+import string
 import textwrap
+import threading
+import time
 import os
-from dateutil.relativedelta import relativedelta
+from decimal import Decimal
+from bridge_in_service_months import MonthArithmetic
+from bridge_in_service_profiling import Profiler
+
+
+class AccrualPolicy:
+    """
+    The PTO accrual rates by months of service: rates[k] applies up to thresholds[k] months,
+    the last rate above the last threshold.
+    """
+
+    __slots__ = ("thresholds", "rates", "tiers")
+
+    def __init__(self, thresholds, rates):
+
+        self.thresholds = tuple(thresholds)
+        self.rates = tuple(rates)
+        # (threshold, rate) pairs in the order they are checked, the last one without an upper bound
+        self.tiers = list(zip(self.thresholds + (float('inf'),), self.rates))
+
+    def __eq__(self, other):
+
+        return isinstance(other, AccrualPolicy) and (self.thresholds, self.rates) == (other.thresholds, other.rates)
+
+    def __hash__(self):
+
+        return hash((self.thresholds, self.rates))
+
+
+AccrualPolicy.DEFAULT = AccrualPolicy((60, 120), (13.33, 16.66, 20))
+
+
+class CalculationContext:
+    """
+    What a calculation runs with: the as-of date ("today"), the accrual policy and an accrual cache.
+
+    The active context is kept in a context variable, so every thread and asyncio task can
+    calculate with its own as-of date without touching the others, while the static Calculation
+    API reads it implicitly through DateOperations.get_todays_date and CalculationContext.active_policy.
+    Outside any context the process-wide DateOperations.test_date (or the current time) and the
+    default policy apply, as before.
+
+    Usage:
+        with CalculationContext(as_of_date).activate():
+            Calculation.calculate_employee(employee)
+
+    accrual_cache is an accrual engine with cached results, such as a ResultCache or an
+    IncrementalCalculation, that Calculation.calculate_employee uses when it is not given one.
+    """
+
+    __slots__ = ("as_of_date", "policy", "accrual_cache")
+
+    current = ContextVar("bridge_in_service_calculation_context", default=None)
+
+    def __init__(self, as_of_date=None, policy=None, accrual_cache=None):
+
+        self.as_of_date = as_of_date
+        self.policy = policy or AccrualPolicy.DEFAULT
+        self.accrual_cache = accrual_cache
+
+    @staticmethod
+    def get():
+        """Return the active context, or None outside of one."""
+        return CalculationContext.current.get()
+
+    @staticmethod
+    def active_policy():
+
+        context = CalculationContext.current.get()
+        return context.policy if context is not None else AccrualPolicy.DEFAULT
+
+    @contextmanager
+    def activate(self):
+
+        token = CalculationContext.current.set(self)
+        try:
+            yield self
+        finally:
+            CalculationContext.current.reset(token)
+
+    def run(self, function, *args, **kwargs):
+        """Call function with this context active."""
+        with self.activate():
+            return function(*args, **kwargs)
+
+    def iterate(self, iterable):
+        """
+        Yield the items of iterable, with this context active while each item is produced but not
+        while the caller handles it, so a generator of results can be consumed from any context.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.activate():
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
 
 
 class DateOperations:
+    # Process-wide as-of date for scripts and tests, a CalculationContext overrides it
     test_date = None
     @staticmethod
     def get_todays_date():
+        context = CalculationContext.current.get()
+        if context is not None and context.as_of_date is not None:
+            return context.as_of_date
         if DateOperations.test_date is not None:
             return DateOperations.test_date
         return datetime.now()
@@ -105,13 +210,19 @@ class Employee:
         self.last_name = last_name
         self.most_recent_start_date = most_recent_start_date
         self.prior_employment_periods = [(most_recent_start_date, DateOperations.get_todays_date())]
-        self.fte_changes = [(most_recent_start_date, initial_fte)]
+        self.employment_period_index = EmploymentPeriodIndex(self.prior_employment_periods)
+        self.fte_changes = []
+        # FTE changes sorted by date, with the first month each change applies to
+        self.fte_timeline_dates = []
+        self.fte_timeline_months = []
+        self.fte_timeline_ftes = []
+        self.add_fte_change(most_recent_start_date, initial_fte)
         self.bridge_in_service_date = None
         self.pto_accrual_difference = 0
         # Initialize accrual data attributes
-        self.original_monthly_accruals = {}
-        self.bridge_monthly_accruals = {}
-        self.accrual_differences = {}
+        self.original_monthly_accruals = MonthlyAccruals()
+        self.bridge_monthly_accruals = MonthlyAccruals()
+        self.accrual_differences = MonthlyAccruals()
 
 
     def get_employee_id(self):
@@ -137,6 +248,7 @@ class Employee:
     def add_employment_period(self, start_date, end_date):
 
         self.prior_employment_periods.append((start_date, end_date))
+        self.employment_period_index.add(start_date, end_date)
 
     def get_employment_periods(self):
 
@@ -145,6 +257,19 @@ class Employee:
     def add_fte_change(self, change_date, new_fte):
 
         self.fte_changes.append((change_date, new_fte))
+        # Insert after changes on the same date so the latest entered change wins
+        position = bisect.bisect_right(self.fte_timeline_dates, change_date)
+        self.fte_timeline_dates.insert(position, change_date)
+        # Changes after the 15th apply from the start of the next month
+        self.fte_timeline_months.insert(position, MonthArithmetic.month_ordinal(change_date) + (change_date.day > 15))
+        self.fte_timeline_ftes.insert(position, new_fte)
+
+    def get_fte_for_month(self, month_ordinal):
+
+        position = bisect.bisect_right(self.fte_timeline_months, month_ordinal)
+        if position == 0:
+            return self.fte_changes[0][1]  # No change applies yet, use the initial FTE set at hiring
+        return self.fte_timeline_ftes[position - 1]
 
     def get_fte_changes(self):
 
@@ -159,6 +284,125 @@ class Employee:
         self.pto_accrual_difference = difference
 
 
+class EmploymentPeriodIndex:
+    """
+    Employment periods merged into disjoint spans kept sorted by start date, for binary search.
+
+    Periods that overlap or touch are coalesced as they are added, so checking a new period
+    against the index is a bisect instead of a scan of every period, and summing the spans
+    counts time covered by more than one period only once. Periods ending before they start
+    cover no time and are left out.
+    """
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, periods=()):
+
+        self.starts = []
+        self.ends = []
+        for start_date, end_date in periods:
+            self.add(start_date, end_date)
+
+    def __len__(self):
+
+        return len(self.starts)
+
+    def __iter__(self):
+
+        return zip(self.starts, self.ends)
+
+    def add(self, start_date, end_date):
+
+        if end_date < start_date:
+            return
+        # The spans from first to last (exclusive) overlap or touch the new period
+        first = bisect.bisect_left(self.ends, start_date)
+        last = bisect.bisect_right(self.starts, end_date)
+        if first < last:
+            start_date = min(start_date, self.starts[first])
+            end_date = max(end_date, self.ends[last - 1])
+        self.starts[first:last] = [start_date]
+        self.ends[first:last] = [end_date]
+
+    def contains(self, date):
+        """Return True if date falls within a period, including its start and end dates."""
+        position = bisect.bisect_right(self.starts, date) - 1
+        return position >= 0 and self.ends[position] >= date
+
+    def overlaps(self, start_date, end_date):
+        """Return True if the period from start_date to end_date shares at least one day with a period."""
+        # Only the last span starting on or before end_date can reach back to start_date
+        position = bisect.bisect_right(self.starts, end_date) - 1
+        return position >= 0 and self.ends[position] >= start_date
+
+    def total_duration(self):
+
+        return sum((end_date - start_date for start_date, end_date in self), timedelta(days=0))
+
+
+class MonthlyAccruals:
+    """
+    Accrued PTO per month in chronological order, stored as parallel lists of
+    month ordinal (see MonthArithmetic.month_ordinal), FTE and hours.
+    Differences between two timelines have no FTE, their ftes entries are None.
+    """
+
+    __slots__ = ("months", "ftes", "hours")
+
+    def __init__(self, months=None, ftes=None, hours=None):
+
+        self.months = months if months is not None else []
+        self.ftes = ftes if ftes is not None else []
+        self.hours = hours if hours is not None else []
+
+    def add_month(self, month_ordinal, fte, hours):
+
+        self.months.append(month_ordinal)
+        self.ftes.append(fte)
+        self.hours.append(hours)
+
+    def __len__(self):
+
+        return len(self.months)
+
+    def __iter__(self):
+
+        return zip(self.months, self.ftes, self.hours)
+
+    def index_of(self, month_ordinal):
+
+        position = bisect.bisect_left(self.months, month_ordinal)
+        if position < len(self.months) and self.months[position] == month_ordinal:
+            return position
+        return None
+
+    def cents(self):
+        # Hours rounded to the cent exactly like formatting them with :.2f, as whole cents
+        return [round(round(hours, 2) * 100) for hours in self.hours]
+
+    def total(self):
+        # Sum of the hours shown for each month, rounded to the cent
+        return Decimal(sum(self.cents())).scaleb(-2)
+
+    @staticmethod
+    def format_hours(hours, fte=None):
+
+        if fte is None:
+            return f"{hours:.2f} Hours"
+        return f"{hours:.2f} Hours (FTE: {fte:.2f})"
+
+    def format_month(self, month_ordinal):
+
+        index = self.index_of(month_ordinal)
+        if index is None:
+            return "0.00 Hours"
+        return MonthlyAccruals.format_hours(self.hours[index], self.ftes[index])
+
+    def to_dict(self):
+        # The {"January 2024": "13.33 Hours (FTE: 1.00)"} format used before MonthlyAccruals
+        return {MonthArithmetic.month_label(month): MonthlyAccruals.format_hours(hours, fte) for month, fte, hours in self}
+
+
 class Verification:
 
     @staticmethod
@@ -200,11 +444,16 @@ class Verification:
     @staticmethod
     def verify_no_overlap(new_start_date, new_end_date, existing_periods):
 
-        for existing_start, existing_end in existing_periods:
+        # An EmploymentPeriodIndex (like employee.employment_period_index) is checked with a binary search
+        if isinstance(existing_periods, EmploymentPeriodIndex):
+            overlap = existing_periods.overlaps(new_start_date, new_end_date) or existing_periods.contains(new_end_date)
+        else:
             # Check if new period starts or ends within an existing period
-            if (new_start_date <= existing_end and new_end_date >= existing_start) or \
-               (new_end_date >= existing_start and new_end_date <= existing_end):
-                return False, "Period overlaps with an existing period."
+            overlap = any((new_start_date <= existing_end and new_end_date >= existing_start) or
+                          (new_end_date >= existing_start and new_end_date <= existing_end)
+                          for existing_start, existing_end in existing_periods)
+        if overlap:
+            return False, "Period overlaps with an existing period."
         return True, "No overlap with existing periods."
 
     @staticmethod
@@ -226,18 +475,24 @@ class Verification:
         if start_date >= most_recent_start_date:
             return False, "Start date must be before the most recent start date."
 
-        for existing_start, existing_end in existing_periods:
-            if start_date >= existing_start and start_date <= existing_end:
-                return False, "Start date overlaps with an existing period."
+        if isinstance(existing_periods, EmploymentPeriodIndex):
+            overlap = existing_periods.contains(start_date)
+        else:
+            overlap = any(existing_start <= start_date <= existing_end for existing_start, existing_end in existing_periods)
+        if overlap:
+            return False, "Start date overlaps with an existing period."
         return True, "Start date is valid."
 
     @staticmethod
     def verify_no_overlap_with_end_date(new_start_date, new_end_date, existing_periods):
 
-        for start_date, end_date in existing_periods:
+        if isinstance(existing_periods, EmploymentPeriodIndex):
+            overlap = existing_periods.overlaps(new_start_date, new_end_date)
+        else:
             # Overlap occurs if the new period starts before an existing period ends AND the new period ends after the existing period starts
-            if new_start_date <= end_date and new_end_date >= start_date:
-                return False, "Period overlaps with an existing period."
+            overlap = any(new_start_date <= end_date and new_end_date >= start_date for start_date, end_date in existing_periods)
+        if overlap:
+            return False, "Period overlaps with an existing period."
         return True, "End date is valid."
 
 
@@ -245,24 +500,15 @@ class Calculation:
 
     @staticmethod
     def calculate_service_months_from_recent_start(employee):
-        # Calculate the bridge in service date
         today = DateOperations.get_todays_date()
         most_recent_start_date = employee.most_recent_start_date  
 
-        # Adjust the start date to the next 16th after the bridge in service date
-        if most_recent_start_date.day >= 16:
-            start_date = most_recent_start_date.replace(day=16) + timedelta(days=32)
-            start_date = start_date.replace(day=16)
-        else:
-            start_date = most_recent_start_date.replace(day=16)
-
-
-        # Get today's date
-        today = DateOperations.get_todays_date()
+        # Adjust the start date to the next 16th after the most recent start date
+        start_date = MonthArithmetic.next_sixteenth(most_recent_start_date)
 
         # Calculate full months between the adjusted start date and today
         if today > start_date:
-            total_months = (today.year - start_date.year) * 12 + (today.month - start_date.month)
+            total_months = MonthArithmetic.month_ordinal(today) - MonthArithmetic.month_ordinal(start_date)
         else:
             total_months = 0
         
@@ -275,44 +521,30 @@ class Calculation:
     
     @staticmethod
     def calculate_service_months_from_recent_start_pre_16(employee):
-        # Get the most recent start date
         today = DateOperations.get_todays_date()
-        most_recent_start_date = employee.most_recent_start_date
-
-        # Determine the end of the month for the current month
-        end_of_current_month = datetime(today.year, today.month, calendar.monthrange(today.year, today.month)[1])
-
-        start_date = most_recent_start_date
-        end_date = end_of_current_month
+        current_month = MonthArithmetic.month_ordinal(today)
+        start_date = employee.most_recent_start_date
 
-        # Calculate the full months between the start date and the end date
-        month_count = (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month)
+        # Calculate the full months between the start date and the end of the current month
+        month_count = current_month - MonthArithmetic.month_ordinal(start_date)
         
-        # If the end date's day is greater than or equal to the start date's day, add one more month
-        if end_date.day >= start_date.day:
+        # If the last day of the current month is greater than or equal to the start date's day, add one more month
+        if MonthArithmetic.days_in_month(current_month) >= start_date.day:
             month_count += 1
             
         return month_count
 
     @staticmethod
     def calculate_service_months_from_bridge(employee):
-        # Calculate the bridge in service date
-        bridge_in_service_date = employee.bridge_in_service_date
-
         # Adjust the start date to the next 16th after the bridge in service date
-        if bridge_in_service_date.day >= 16:
-            start_date = bridge_in_service_date.replace(day=16) + timedelta(days=32)
-            start_date = start_date.replace(day=16)
-        else:
-            start_date = bridge_in_service_date.replace(day=16)
-
+        start_date = MonthArithmetic.next_sixteenth(employee.bridge_in_service_date)
 
         # Get today's date
         today = DateOperations.get_todays_date()
 
         # Calculate full months between the adjusted start date and today
         if today > start_date:
-            total_months = (today.year - start_date.year) * 12 + (today.month - start_date.month)
+            total_months = MonthArithmetic.month_ordinal(today) - MonthArithmetic.month_ordinal(start_date)
         else:
             total_months = 0
         
@@ -320,23 +552,15 @@ class Calculation:
     
     @staticmethod
     def calculate_service_months_from_bridge_pre_16(employee):
-        # Get today's date
         today = DateOperations.get_todays_date()
+        current_month = MonthArithmetic.month_ordinal(today)
+        start_date = employee.bridge_in_service_date
 
-        # Get the bridge in service date
-        bridge_in_service_date = employee.bridge_in_service_date
-
-        # Determine the end of the current month for any given day
-        end_of_current_month = datetime(today.year, today.month, calendar.monthrange(today.year, today.month)[1])
-
-        start_date = bridge_in_service_date
-        end_date = end_of_current_month
-
-        # Calculate the full months between the start date and the end date
-        month_count = (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month)
+        # Calculate the full months between the start date and the end of the current month
+        month_count = current_month - MonthArithmetic.month_ordinal(start_date)
         
-        # If the end date's day is greater than or equal to the start date's day, add one more month
-        if end_date.day >= start_date.day:
+        # If the last day of the current month is greater than or equal to the start date's day, add one more month
+        if MonthArithmetic.days_in_month(current_month) >= start_date.day:
             month_count += 1
             
         return month_count
@@ -344,23 +568,20 @@ class Calculation:
     
 
     @staticmethod
-    def get_accrual_rate_for_months_of_service(months_of_service, fte, employee):
+    def get_accrual_rate_for_months_of_service(months_of_service, fte, employee, policy=None):
         """
         Calculates the PTO accrual rate based on the number of months of service and full-time equivalence (FTE).
 
         Parameters:
         months_of_service (int): The total months of service.
         fte (float): The full-time equivalence factor.
+        policy (AccrualPolicy): The accrual rates. Defaults to the policy of the active CalculationContext.
 
         Returns:
         float: The calculated accrual rate per month adjusted by FTE.
         """
-        # Define the accrual rates
-        thresholds = [
-            (60, 13.33),
-            (120, 16.66),
-            (float('inf'), 20)  # This effectively handles any case above 120 months
-        ]
+        # The accrual rates, by default 13.33 up to 60 months, 16.66 up to 120 and 20 above
+        thresholds = (policy or CalculationContext.active_policy()).tiers
 
         # Determine the accrual rate based on the thresholds
         for threshold, rate in thresholds:
@@ -376,73 +597,57 @@ class Calculation:
 
     @staticmethod
     def calculate_pto_accrual_rate(employee):
-        total_service_months = Calculation.calculate_service_months_from_recent_start(employee)
-        total_service_months_pre_16 = Calculation.calculate_service_months_from_recent_start_pre_16(employee)
         total_pto_accrued = 0
-        accrual_details = {}  # Dictionary to store detailed accruals per month
+        accrual_details = MonthlyAccruals()  # Detailed accruals per month
+        start_month = MonthArithmetic.month_ordinal(employee.most_recent_start_date)
         today = DateOperations.get_todays_date()
+        policy = CalculationContext.active_policy()
 
-        # Compute each month's effective start and end date, then calculate accrual
+        # Calculate the accrual of each month after the most recent start date
         if today.day < 16:
+            total_service_months = Calculation.calculate_service_months_from_recent_start(employee)
             for i in range(1, total_service_months):
-                month_incremented = (employee.most_recent_start_date.month + i - 1) % 12 + 1
-                year_incremented = employee.most_recent_start_date.year + (employee.most_recent_start_date.month + i - 1) // 12
-
-                effective_month_start = datetime(year_incremented, month_incremented, 1)
-                days_in_month = calendar.monthrange(year_incremented, month_incremented)[1]
-                effective_month_end = datetime(year_incremented, month_incremented, days_in_month)
-
-                current_fte = Calculation.update_fte_based_on_changes(employee, effective_month_start, effective_month_end)
+                month = start_month + i
+                current_fte = employee.get_fte_for_month(month)
                 adjusted_service_months = Calculation.calculate_adjusted_service_months_for_most_recent(total_service_months, total_service_months, i, employee)
-                pto_accrued_this_month = Calculation.get_accrual_rate_for_months_of_service(adjusted_service_months, current_fte, employee)
+                pto_accrued_this_month = Calculation.get_accrual_rate_for_months_of_service(adjusted_service_months, current_fte, employee, policy)
 
-                month_year = effective_month_start.strftime("%B %Y")
-                accrual_details[month_year] = f"{pto_accrued_this_month:.2f} Hours (FTE: {current_fte:.2f})"
+                accrual_details.add_month(month, current_fte, pto_accrued_this_month)
 
                 total_pto_accrued += pto_accrued_this_month
         else:
+            total_service_months_pre_16 = Calculation.calculate_service_months_from_recent_start_pre_16(employee)
             for i in range(1, total_service_months_pre_16):
-                month_incremented = (employee.most_recent_start_date.month + i - 1) % 12 + 1
-                year_incremented = employee.most_recent_start_date.year + (employee.most_recent_start_date.month + i - 1) // 12
-
-                effective_month_start = datetime(year_incremented, month_incremented, 1)
-                days_in_month = calendar.monthrange(year_incremented, month_incremented)[1]
-                effective_month_end = datetime(year_incremented, month_incremented, days_in_month)
-
-                current_fte = Calculation.update_fte_based_on_changes(employee, effective_month_start, effective_month_end)
+                month = start_month + i
+                current_fte = employee.get_fte_for_month(month)
                 adjusted_service_months = Calculation.calculate_adjusted_service_months_for_most_recent_post_16(total_service_months_pre_16, total_service_months_pre_16, i, employee)
-                pto_accrued_this_month = Calculation.get_accrual_rate_for_months_of_service(adjusted_service_months, current_fte, employee)
+                pto_accrued_this_month = Calculation.get_accrual_rate_for_months_of_service(adjusted_service_months, current_fte, employee, policy)
 
-                month_year = effective_month_start.strftime("%B %Y")
-                accrual_details[month_year] = f"{pto_accrued_this_month:.2f} Hours (FTE: {current_fte:.2f})"
+                accrual_details.add_month(month, current_fte, pto_accrued_this_month)
 
                 total_pto_accrued += pto_accrued_this_month
 
         return round(total_pto_accrued, 2), accrual_details
     
     @staticmethod
-    def calculate_accrual_differences(accruals_dict1, accruals_dict2):
+    def calculate_accrual_differences(accruals1, accruals2):
         """
-        Calculate the differences between two accrual dictionaries, and sort by month.
+        Calculate the differences between two monthly accruals, by month.
 
         Parameters:
-        accruals_dict1 (dict): The first dictionary of accruals.
-        accruals_dict2 (dict): The second dictionary of accruals.
+        accruals1 (MonthlyAccruals): The first monthly accruals.
+        accruals2 (MonthlyAccruals): The second monthly accruals.
 
         Returns:
-        dict: A dictionary with the differences in accruals, formatted as strings and sorted by month.
+        MonthlyAccruals: The differences in accruals rounded to the cent, in chronological order.
         """
-        accrual_differences = {}
-        all_months = set(accruals_dict1.keys()).union(accruals_dict2.keys())
-
-        # Convert month names to datetime to sort them
-        sorted_months = sorted(all_months, key=lambda date: datetime.strptime(date, "%B %Y"))
+        cents1 = dict(zip(accruals1.months, accruals1.cents()))
+        cents2 = dict(zip(accruals2.months, accruals2.cents()))
+        accrual_differences = MonthlyAccruals()
 
-        for month in sorted_months:
-            accrual1 = float(accruals_dict1.get(month, "0.00 Hours").split()[0])
-            accrual2 = float(accruals_dict2.get(month, "0.00 Hours").split()[0])
-            difference = accrual2 - accrual1
-            accrual_differences[month] = f"{difference:.2f} Hours"
+        for month in sorted(cents1.keys() | cents2.keys()):
+            difference = cents2.get(month, 0) - cents1.get(month, 0)
+            accrual_differences.add_month(month, None, difference / 100)
 
         return accrual_differences
     
@@ -542,6 +747,7 @@ class Calculation:
         """
         Update the FTE based on changes that fall within the specified month period.
         Once an FTE change is applicable, it should continue to be applied forward until a new change overrides it.
+        Changes after the 15th apply from the start of the next month.
 
         Parameters:
         employee (Employee): The employee whose FTE changes are to be updated.
@@ -551,145 +757,321 @@ class Calculation:
         Returns:
         float: Updated FTE after applying relevant changes.
         """
-        current_fte = employee.fte_changes[0][1]  # Start with the initial FTE set at hiring
-        applicable_fte = current_fte  # This will store the most recently applicable FTE change
-
-        for change_date, new_fte in sorted(employee.fte_changes, key=lambda x: x[0]):
-            # Check if the change is within the current month and before the 15th or in previous months
-            if change_date <= current_month_end:
-                if change_date.day <= 15 or change_date < current_month_start:
-                    applicable_fte = new_fte
-                elif change_date.day > 15 and change_date.month == current_month_start.month:
-                    # Changes after the 15th should apply from the start of the next month
-                    next_month_start = current_month_end.replace(day=1) + timedelta(days=32)
-                    next_month_start = next_month_start.replace(day=1)
-                    if current_month_start >= next_month_start:
-                        applicable_fte = new_fte
-
-        return applicable_fte
+        # The employee keeps its changes sorted, so this is a binary search instead of a sort per month
+        return employee.get_fte_for_month(MonthArithmetic.month_ordinal(current_month_start))
 
     @staticmethod
     def calculate_bridge_pto_accrual_rate(employee):
-        total_service_months = Calculation.calculate_service_months_from_bridge(employee)
-        total_service_months_pre_16 = Calculation.calculate_service_months_from_bridge_pre_16(employee)
-        service_months_since_recent_start = Calculation.calculate_service_months_from_recent_start(employee)
-        service_months_since_recent_start_pre_16 = Calculation.calculate_service_months_from_recent_start_pre_16(employee)
+        total_pto_accrued = 0
+        accrual_details = MonthlyAccruals()  # Detailed accruals per month
+        start_month = MonthArithmetic.month_ordinal(employee.most_recent_start_date)
         today = DateOperations.get_todays_date()
+        policy = CalculationContext.active_policy()
 
-        total_pto_accrued = 0
-        accrual_details = {}  # Dictionary to store detailed accruals per month
         if today.day < 16:
+            total_service_months = Calculation.calculate_service_months_from_bridge(employee)
+            service_months_since_recent_start = Calculation.calculate_service_months_from_recent_start(employee)
             for i in range(1, service_months_since_recent_start):  # Start from 1 to skip the first month
-                month_incremented = (employee.most_recent_start_date.month + i - 1) % 12 + 1
-                year_incremented = employee.most_recent_start_date.year + (employee.most_recent_start_date.month + i - 1) // 12
-
-                effective_month_start = datetime(year_incremented, month_incremented, 1)
-                days_in_month = calendar.monthrange(year_incremented, month_incremented)[1]
-                effective_month_end = datetime(year_incremented, month_incremented, days_in_month)
-
-                current_fte = Calculation.update_fte_based_on_changes(employee, effective_month_start, effective_month_end)
+                month = start_month + i
+                current_fte = employee.get_fte_for_month(month)
                 adjusted_service_months = Calculation.calculate_adjusted_service_months_for_bridge(total_service_months, service_months_since_recent_start, i, employee)
-                pto_accrued_this_month = Calculation.get_accrual_rate_for_months_of_service(adjusted_service_months, current_fte, employee)
+                pto_accrued_this_month = Calculation.get_accrual_rate_for_months_of_service(adjusted_service_months, current_fte, employee, policy)
 
-                month_year = effective_month_start.strftime("%B %Y")
-                accrual_details[month_year] = f"{pto_accrued_this_month:.2f} Hours (FTE: {current_fte:.2f})"
+                accrual_details.add_month(month, current_fte, pto_accrued_this_month)
 
                 total_pto_accrued += pto_accrued_this_month
         else:
+            total_service_months_pre_16 = Calculation.calculate_service_months_from_bridge_pre_16(employee)
+            service_months_since_recent_start_pre_16 = Calculation.calculate_service_months_from_recent_start_pre_16(employee)
             for i in range(1, service_months_since_recent_start_pre_16):  # Start from 1 to skip the first month
-                month_incremented = (employee.most_recent_start_date.month + i - 1) % 12 + 1
-                year_incremented = employee.most_recent_start_date.year + (employee.most_recent_start_date.month + i - 1) // 12
-
-                effective_month_start = datetime(year_incremented, month_incremented, 1)
-                days_in_month = calendar.monthrange(year_incremented, month_incremented)[1]
-                effective_month_end = datetime(year_incremented, month_incremented, days_in_month)
-
-                current_fte = Calculation.update_fte_based_on_changes(employee, effective_month_start, effective_month_end)
+                month = start_month + i
+                current_fte = employee.get_fte_for_month(month)
                 adjusted_service_months = Calculation.calculate_adjusted_service_months_for_bridge_post_16(total_service_months_pre_16, service_months_since_recent_start_pre_16, i, employee)
-                pto_accrued_this_month = Calculation.get_accrual_rate_for_months_of_service(adjusted_service_months, current_fte, employee)
+                pto_accrued_this_month = Calculation.get_accrual_rate_for_months_of_service(adjusted_service_months, current_fte, employee, policy)
 
-                month_year = effective_month_start.strftime("%B %Y")
-                accrual_details[month_year] = f"{pto_accrued_this_month:.2f} Hours (FTE: {current_fte:.2f})"
+                accrual_details.add_month(month, current_fte, pto_accrued_this_month)
 
                 total_pto_accrued += pto_accrued_this_month
         return round(total_pto_accrued, 2), accrual_details
 
+    @staticmethod
+    def calculate_accrual_window(employee, bridge=False):
+        """
+        Describe the months the accrual loops run over without running them.
+
+        Parameters:
+        employee (Employee): The employee. For the bridge window the bridge in service date must be set.
+        bridge (bool): Describe calculate_bridge_pto_accrual_rate instead of calculate_pto_accrual_rate.
+
+        Returns:
+        tuple: (first_month, month_count, service_month_offset). Loop month i (from 1) is the month
+        ordinal first_month + i - 1 and its adjusted service months are i + service_month_offset.
+        """
+        today = DateOperations.get_todays_date()
+        if today.day < 16:
+            months_since_recent_start = Calculation.calculate_service_months_from_recent_start(employee)
+            if bridge:
+                total_service_months = Calculation.calculate_service_months_from_bridge(employee)
+                offset = Calculation.calculate_adjusted_service_months_for_bridge(total_service_months, months_since_recent_start, 0, employee)
+            else:
+                offset = Calculation.calculate_adjusted_service_months_for_most_recent(months_since_recent_start, months_since_recent_start, 0, employee)
+        else:
+            months_since_recent_start = Calculation.calculate_service_months_from_recent_start_pre_16(employee)
+            if bridge:
+                total_service_months = Calculation.calculate_service_months_from_bridge_pre_16(employee)
+                offset = Calculation.calculate_adjusted_service_months_for_bridge_post_16(total_service_months, months_since_recent_start, 0, employee)
+            else:
+                offset = Calculation.calculate_adjusted_service_months_for_most_recent_post_16(months_since_recent_start, months_since_recent_start, 0, employee)
+
+        # The loops run for i in range(1, months_since_recent_start)
+        first_month = MonthArithmetic.month_ordinal(employee.most_recent_start_date) + 1
+        return first_month, max(months_since_recent_start - 1, 0), offset
+
+    @staticmethod
+    def calculate_accrual_total(employee, bridge=False):
+        """
+        Total of the monthly accruals of calculate_pto_accrual_rate (or calculate_bridge_pto_accrual_rate)
+        as MonthlyAccruals.total() gives it, without calculating the months one by one.
+
+        The accrual rate only changes at the policy's tiers (60 and 120 months) and the FTE only at FTE changes, so
+        every month between two of these has the same hours. Each such segment adds its number of months
+        times the hours of its first month rounded to the cent, which is exactly the sum of the months.
+
+        Parameters:
+        employee (Employee): The employee, with the bridge in service date set.
+        bridge (bool): Total the accruals from the bridge in service date instead of the most recent start date.
+
+        Returns:
+        Decimal: The total accrued hours rounded to the cent.
+        """
+        first_month, month_count, offset = Calculation.calculate_accrual_window(employee, bridge)
+        policy = CalculationContext.active_policy()
+
+        # Loop month i (from 1) is month first_month + i - 1 with adjusted service months i + offset.
+        # A new segment starts after each tier threshold and wherever an FTE change applies from.
+        segment_starts = {1}
+        segment_starts.update(threshold - offset + 1 for threshold in policy.thresholds)
+        segment_starts.update(month - first_month + 1 for month in employee.fte_timeline_months)
+        segment_starts = sorted(i for i in segment_starts if 1 <= i <= month_count)
+        segment_starts.append(month_count + 1)
+
+        total_cents = 0
+        for start, end in zip(segment_starts, segment_starts[1:]):
+            fte = employee.get_fte_for_month(first_month + start - 1)
+            hours = Calculation.get_accrual_rate_for_months_of_service(start + offset, fte, employee, policy)
+            total_cents += (end - start) * round(round(hours, 2) * 100)
+        return Decimal(total_cents).scaleb(-2)
+
+    @staticmethod
+    def calculate_employee_totals(employee):
+        """
+        Totals-only version of calculate_employee for callers that do not need the monthly accruals.
+
+        The bridge in service date and PTO accrual difference are stored on the employee, the
+        monthly accruals are left empty.
+
+        Parameters:
+        employee (Employee): The employee with all employment periods and FTE changes added.
+
+        Returns:
+        tuple: (bridge_in_service_date, total_original, total_bridge, total_difference), the totals equal
+        to the ones calculate_employee returns.
+        """
+        bridge_in_service_date = Calculation.calculate_bridge_in_service_date(employee)
+        total_original = Calculation.calculate_accrual_total(employee)
+        total_bridge = Calculation.calculate_accrual_total(employee, bridge=True)
+        total_difference = (total_bridge - total_original).quantize(Decimal('0.00'))
+        employee.update_pto_accrual_difference(total_difference)
+        return bridge_in_service_date, total_original, total_bridge, total_difference
+
     @staticmethod
     def calculate_total_service_duration(prior_employment_periods):
 
-        total_duration = timedelta(days=0)
-        for start_date, end_date in prior_employment_periods:
-            period_duration = end_date - start_date
-            total_duration += period_duration
-        return total_duration
+        # Merge overlapping periods first so time covered by more than one period is only counted once
+        if not isinstance(prior_employment_periods, EmploymentPeriodIndex):
+            prior_employment_periods = EmploymentPeriodIndex(prior_employment_periods)
+        return prior_employment_periods.total_duration()
 
     @staticmethod
     def calculate_bridge_in_service_date(employee):
 
-        total_service_duration = Calculation.calculate_total_service_duration(employee.prior_employment_periods)
+        total_service_duration = Calculation.calculate_total_service_duration(employee.employment_period_index)
         bridge_in_service_date = DateOperations.get_todays_date() - total_service_duration
         employee.set_bridge_in_service_date(bridge_in_service_date)
         return bridge_in_service_date
+
+    @staticmethod
+    def calculate_accrual_totals(original_monthly_accruals, bridge_monthly_accruals):
+        """
+        Sum the monthly accruals of both timelines.
+
+        Parameters:
+        original_monthly_accruals (MonthlyAccruals): Monthly accruals from the most recent start date.
+        bridge_monthly_accruals (MonthlyAccruals): Monthly accruals from the bridge in service date.
+
+        Returns:
+        tuple: (total_original, total_bridge, total_difference) as Decimals rounded to the cent.
+        """
+        total_original = original_monthly_accruals.total()
+        total_bridge = bridge_monthly_accruals.total()
+        total_difference = (total_bridge - total_original).quantize(Decimal('0.00'))
+        return total_original, total_bridge, total_difference
+
+    @staticmethod
+    def calculate_employee(employee, accrual_engine=None):
+        """
+        Run the full bridge in service calculation for an employee and store the results on it.
+
+        Parameters:
+        employee (Employee): The employee with all employment periods and FTE changes added.
+        accrual_engine: Provides calculate_pto_accrual_rate and calculate_bridge_pto_accrual_rate with the
+        same results as Calculation, for example AccrualKernel or an IncrementalCalculation. Defaults to the
+        accrual cache of the active CalculationContext, if any, otherwise Calculation.
+
+        Returns:
+        tuple: (total_original, total_bridge, total_difference) as returned by calculate_accrual_totals.
+        """
+        if accrual_engine is None:
+            context = CalculationContext.get()
+            accrual_engine = context.accrual_cache if context is not None and context.accrual_cache is not None else Calculation
+        Calculation.calculate_bridge_in_service_date(employee)
+        _, original_monthly_accruals = accrual_engine.calculate_pto_accrual_rate(employee)
+        _, bridge_monthly_accruals = accrual_engine.calculate_bridge_pto_accrual_rate(employee)
+        accrual_differences = Calculation.calculate_accrual_differences(original_monthly_accruals, bridge_monthly_accruals)
+        # Store accrual details in the employee object
+        employee.original_monthly_accruals = original_monthly_accruals
+        employee.bridge_monthly_accruals = bridge_monthly_accruals
+        employee.accrual_differences = accrual_differences
+
+        totals = Calculation.calculate_accrual_totals(original_monthly_accruals, bridge_monthly_accruals)
+        employee.update_pto_accrual_difference(totals[2])
+        return totals
     
 class ExcelExport:
 
+    # Where the GUI exports to, set BRIDGE_IN_SERVICE_EXPORT_DIR to export somewhere else
+    DEFAULT_DIRECTORY = os.environ.get("BRIDGE_IN_SERVICE_EXPORT_DIR", "C:\\Hospital HR\\Operations\\VOE (Letters, Completed VOEs, etc)\\Bridge in Service")
+
+    INFO_TITLES = ["Employee ID", "First Name", "Last Name", "Most Recent Start Date", "Bridge In Service Date", "PTO Accrual Difference"]
+    ACCRUAL_TITLES = ["Month Year", "Original", "Bridge", "Difference"]
+
+    @staticmethod
+    def employee_info(employee):
+
+        return [
+            employee.employee_id,
+            employee.first_name,
+            employee.last_name,
+            employee.most_recent_start_date.strftime("%m/%d/%Y"),
+            employee.bridge_in_service_date.strftime("%m/%d/%Y") if employee.bridge_in_service_date else "N/A",
+            employee.pto_accrual_difference
+        ]
+
+    @staticmethod
+    def employee_rows(employee, original_monthly_accruals, bridge_monthly_accruals, accrual_differences):
+        """
+        Yield the rows of an employee's worksheet: the bridge in service data in columns A and B,
+        and the monthly accruals with a totals row from column D.
+        """
+        info = list(zip(ExcelExport.INFO_TITLES, ExcelExport.employee_info(employee)))
+
+        def accrual_rows():
+            yield ExcelExport.ACCRUAL_TITLES
+            for month, _, difference in accrual_differences:
+                yield [
+                    MonthArithmetic.month_label(month),
+                    original_monthly_accruals.format_month(month),
+                    bridge_monthly_accruals.format_month(month),
+                    MonthlyAccruals.format_hours(difference)
+                ]
+            total_original, total_bridge, total_difference = Calculation.calculate_accrual_totals(original_monthly_accruals, bridge_monthly_accruals)
+            yield ["Total", f"{total_original:.2f} Hours", f"{total_bridge:.2f} Hours", f"{total_difference:.2f} Hours"]
+
+        for i, accrual_row in enumerate(accrual_rows()):
+            title, value = info[i] if i < len(info) else (None, None)
+            yield [title, value, None] + accrual_row
+        for title, value in info[i + 1:]:
+            yield [title, value]
+
+    @staticmethod
+    def update_column_widths(column_widths, row):
+        # Keep the widest value of each column, sized like the cell text plus padding
+        for col_idx, value in enumerate(row):
+            width = len(str(value)) + 2
+            if col_idx == len(column_widths):
+                column_widths.append(width)
+            elif width > column_widths[col_idx]:
+                column_widths[col_idx] = width
+
+    @staticmethod
+    def set_column_widths(ws, column_widths):
+
+        from openpyxl.utils import get_column_letter
+        for col_idx, width in enumerate(column_widths, start=1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+    @staticmethod
+    def save_workbook(wb, file):
+
+        wb.save(file)
+
+    @staticmethod
+    def employee_file_name(employee):
+
+        return f"{employee.employee_id} {employee.last_name}, {employee.first_name} Bridge In Service.xlsx"
+
+    @staticmethod
+    def render_employee_workbook(employee, original_monthly_accruals, bridge_monthly_accruals, accrual_differences):
+        """Render an employee's workbook in memory and return the contents of the .xlsx file."""
+        import openpyxl  # Loaded on first export, it is slow to import and only needed here
+        wb = openpyxl.Workbook()
+        ws = wb.active
+
+        # Populate bridge in service and accrual data, sizing columns as the rows are added
+        column_widths = []
+        for row in ExcelExport.employee_rows(employee, original_monthly_accruals, bridge_monthly_accruals, accrual_differences):
+            ws.append(row)
+            ExcelExport.update_column_widths(column_widths, row)
+
+        # Auto size columns for better readability
+        ExcelExport.set_column_widths(ws, column_widths)
+
+        buffer = io.BytesIO()
+        ExcelExport.save_workbook(wb, buffer)
+        return buffer.getvalue()
+
+    @staticmethod
+    def write_file(file_path, data, retries=3, retry_delay=0.5):
+        """
+        Write data to file_path through a temporary file in the same directory that is renamed into
+        place, so the file is never seen half written. I/O errors, common on the HR file share, are
+        retried with a doubling delay before the last one is raised.
+        """
+        directory_path, file_name = os.path.split(file_path)
+        temp_path = os.path.join(directory_path, f"~{file_name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        for attempt in range(retries + 1):
+            try:
+                with open(temp_path, "wb") as temp_file:
+                    temp_file.write(data)
+                os.replace(temp_path, file_path)
+                return
+            except OSError:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                if attempt == retries:
+                    raise
+                time.sleep(retry_delay * 2 ** attempt)
+
     @staticmethod
     def try_export_employee_data(employee, directory_path, original_monthly_accruals, bridge_monthly_accruals, accrual_differences):
         try:
-            wb = openpyxl.Workbook()
-            ws = wb.active
-
-            # Populate bridge in service data
-            info_titles = ["Employee ID", "First Name", "Last Name", "Most Recent Start Date", "Bridge In Service Date", "PTO Accrual Difference"]
-            info_values = [
-                employee.employee_id,
-                employee.first_name,
-                employee.last_name,
-                employee.most_recent_start_date.strftime("%m/%d/%Y"),
-                employee.bridge_in_service_date.strftime("%m/%d/%Y") if employee.bridge_in_service_date else "N/A",
-                employee.pto_accrual_difference
-            ]
-
-            for i, title in enumerate(info_titles, start=1):
-                ws[f'A{i}'] = title
-                ws[f'B{i}'] = info_values[i-1]
-
-            # Calculate start column for accrual data
-            accrual_start_col = 'D'
-            ws[f'{accrual_start_col}1'] = "Month Year"
-            ws[f'{chr(ord(accrual_start_col)+1)}1'] = "Original"
-            ws[f'{chr(ord(accrual_start_col)+2)}1'] = "Bridge"
-            ws[f'{chr(ord(accrual_start_col)+3)}1'] = "Difference"
-            accrual_row = 2
-
-            # Add accrual data rows
-            for month in accrual_differences:
-                ws[f'{accrual_start_col}{accrual_row}'] = month
-                ws[f'{chr(ord(accrual_start_col)+1)}{accrual_row}'] = original_monthly_accruals.get(month, '0.00 Hours')
-                ws[f'{chr(ord(accrual_start_col)+2)}{accrual_row}'] = bridge_monthly_accruals.get(month, '0.00 Hours')
-                ws[f'{chr(ord(accrual_start_col)+3)}{accrual_row}'] = accrual_differences[month]
-                accrual_row += 1
-
-            # Accumulate totals and add them to Excel
-            total_original = sum(float(details.split()[0]) for details in original_monthly_accruals.values())
-            total_bridge = sum(float(details.split()[0]) for details in bridge_monthly_accruals.values())
-            total_difference = total_bridge - total_original
-
-            # Add totals row
-            ws[f'{accrual_start_col}{accrual_row}'] = "Total"
-            ws[f'{chr(ord(accrual_start_col)+1)}{accrual_row}'] = f"{total_original:.2f} Hours"
-            ws[f'{chr(ord(accrual_start_col)+2)}{accrual_row}'] = f"{total_bridge:.2f} Hours"
-            ws[f'{chr(ord(accrual_start_col)+3)}{accrual_row}'] = f"{total_difference:.2f} Hours"
-
-            # Auto size columns for better readability
-            for col in ws.columns:
-                max_length = max((len(str(cell.value)) for cell in col), default=0)
-                ws.column_dimensions[col[0].column_letter].width = max_length + 2
+            data = ExcelExport.render_employee_workbook(employee, original_monthly_accruals, bridge_monthly_accruals, accrual_differences)
 
             # Save the workbook
-            file_name = f"{employee.employee_id} {employee.last_name}, {employee.first_name} Bridge In Service.xlsx"
-            file_path = os.path.join(directory_path, file_name)
-            wb.save(file_path)
+            file_path = os.path.join(directory_path, ExcelExport.employee_file_name(employee))
+            ExcelExport.write_file(file_path, data)
             
             print(f"Data exported successfully to {file_path}")
             return True
@@ -697,63 +1079,166 @@ class ExcelExport:
             print(f"Failed to export data to Excel: {e}")
             return False
 
+    @staticmethod
+    def try_export_batch(employees, file_path, sheet_per_employee=True):
+        """
+        Export a batch of calculated employees to one workbook using openpyxl's write-only mode.
+
+        Parameters:
+        employees (iterable): Employees with their accruals calculated, for example by Calculation.calculate_employee.
+        file_path (str): Path of the workbook to write.
+        sheet_per_employee (bool): Add a worksheet with the monthly accruals of each employee after the summary.
+
+        Returns:
+        bool: True if the workbook was saved.
+        """
+        try:
+            import openpyxl
+            wb = openpyxl.Workbook(write_only=True)
+            summary_ws = wb.create_sheet("Bridge In Service")
+            # Write-only sheets need their column widths before the first row, so the summary (one short
+            # row per employee) is written last while each employee's rows are streamed out as they come.
+            summary_rows = []
+            summary_widths = []
+            ExcelExport.update_column_widths(summary_widths, ExcelExport.INFO_TITLES)
+
+            for employee in employees:
+                info = ExcelExport.employee_info(employee)
+                summary_rows.append(info)
+                ExcelExport.update_column_widths(summary_widths, info)
+
+                if sheet_per_employee:
+                    rows = list(ExcelExport.employee_rows(employee, employee.original_monthly_accruals, employee.bridge_monthly_accruals, employee.accrual_differences))
+                    column_widths = []
+                    for row in rows:
+                        ExcelExport.update_column_widths(column_widths, row)
+                    # Sheet titles are limited to 31 characters and cannot contain : \ / ? * [ ]
+                    title = "".join(c for c in f"{employee.employee_id} {employee.last_name}" if c not in ':\\/?*[]')[:31]
+                    ws = wb.create_sheet(title)
+                    ExcelExport.set_column_widths(ws, column_widths)
+                    for row in rows:
+                        ws.append(row)
+                    ws.close()
+
+            ExcelExport.set_column_widths(summary_ws, summary_widths)
+            summary_ws.append(ExcelExport.INFO_TITLES)
+            for info in summary_rows:
+                summary_ws.append(info)
+
+            ExcelExport.save_workbook(wb, file_path)
+            print(f"Data exported successfully to {file_path}")
+            return True
+        except Exception as e:
+            print(f"Failed to export data to Excel: {e}")
+            return False
+
 
 class Email:
 
+    SUBJECT = 'Bridge in Service'
+
+    # Compiled once, render_memo only substitutes the employee's details
+    MEMO_TEMPLATE = string.Template(textwrap.dedent("""\
+        <html>
+        <head>
+            <style>
+                body { font-family: 'Century Gothic', sans-serif; }
+            </style>
+        </head>
+        <body>
+            <p>Memorandum</p>
+            <p>To: $first_name $last_name<br>
+            From: University of Utah Hospitals and Clinics Benefits Department<br>
+            Date: $memo_date<br>
+            Subject: Service Date Adjustment</p>
+
+            <p>I am pleased to notify you that your application for a reinstatement of prior service has been approved. This process takes any 0.75 FTE (or above) benefited time and adds that to your most recent hire date.</p>
+
+            <p>Your new continuous “service date” is <strong>$bridge_in_service_date</strong> rather than $most_recent_start_date.</p>
+
+            <p>$pto_difference_line</p>
+
+            <p>We are pleased that the Board of Trustees has approved this policy which recognizes the service of many valued employees such as you who rejoined the University following a break in service.</p>
+
+            <p>If you have any questions please feel free to contact the Human Resource Department at 801-581-6500.</p>
+
+            <p>Thank you,</p>
+
+            <p><strong>Benefits Department</strong><br>
+            Hospitals and Clinics</p>
+      
+            <p><strong><span style="color: #BE0000;">Hospitals and Clinics Human Resources</span></strong><br>
+            525 E 100 S 1st Floor Suite 1810<br>
+            Salt Lake City UT 84102<br>
+            Ph 801.581.6500 | Fax 801.585.5144</p>
+        </body>
+        </html>
+        """))
+
+    @staticmethod
+    def email_address(employee):
+
+        return f'u{employee.employee_id[1:]}@utah.edu'
+
+    @staticmethod
+    def render_memo(employee, memo_date=None):
+        """
+        Render the bridge in service memo for a calculated employee as HTML.
+
+        Parameters:
+        employee (Employee): The employee, with the bridge in service date and PTO accrual difference calculated.
+        memo_date (str): The date shown on the memo (MM/DD/YYYY). Defaults to today, batches pass it once for all memos.
+
+        Returns:
+        str: The HTML body of the memo.
+        """
+        pto_difference_line = ''
+        if employee.pto_accrual_difference > 0:
+            pto_difference_line = f"<strong>{employee.pto_accrual_difference:.2f}</strong> hours of PTO have been added to your accruals. You will see this reflected in your PTO bank within 1-2 paychecks. Please inform your payroll reporter these changes have been made."
+
+        return Email.MEMO_TEMPLATE.substitute(
+            first_name=employee.first_name,
+            last_name=employee.last_name,
+            memo_date=memo_date or DateOperations.get_todays_date().strftime("%m/%d/%Y"),
+            bridge_in_service_date=employee.bridge_in_service_date.strftime("%m/%d/%Y"),
+            most_recent_start_date=employee.most_recent_start_date.strftime("%m/%d/%Y"),
+            pto_difference_line=pto_difference_line
+        )
+
+    @staticmethod
+    def display_outlook_mail(subject, html_body, to):
+
+        # pywin32 is only needed (and only available on Windows) when an email is opened
+        import win32com.client as win32
+        outlook = win32.Dispatch('outlook.application')
+        mail = outlook.CreateItem(0)
+        mail.Subject = subject
+        mail.HTMLBody = html_body
+        mail.To = to
+        mail.Display()
+
     @staticmethod
     def try_send_email(employee):
 
         try:
-            pto_difference_line = ''
-            if employee.pto_accrual_difference > 0:
-                pto_difference_line = f"<strong>{employee.pto_accrual_difference:.2f}</strong> hours of PTO have been added to your accruals. You will see this reflected in your PTO bank within 1-2 paychecks. Please inform your payroll reporter these changes have been made."
-
-            outlook = win32.Dispatch('outlook.application')
-            mail = outlook.CreateItem(0)
-            mail.Subject = 'Bridge in Service'
-
-            email_body = textwrap.dedent(f"""\
-                <html>
-                <head>
-                    <style>
-                        body {{ font-family: 'Century Gothic', sans-serif; }}
-                    </style>
-                </head>
-                <body>
-                    <p>Memorandum</p>
-                    <p>To: {employee.first_name} {employee.last_name}<br>
-                    From: University of Utah Hospitals and Clinics Benefits Department<br>
-                    Date: {DateOperations.get_todays_date().strftime("%m/%d/%Y")}<br>
-                    Subject: Service Date Adjustment</p>
-
-                    <p>I am pleased to notify you that your application for a reinstatement of prior service has been approved. This process takes any 0.75 FTE (or above) benefited time and adds that to your most recent hire date.</p>
-
-                    <p>Your new continuous “service date” is <strong>{employee.bridge_in_service_date.strftime("%m/%d/%Y")}</strong> rather than {employee.most_recent_start_date.strftime("%m/%d/%Y")}.</p>
-
-                    <p>{pto_difference_line}</p>
-
-                    <p>We are pleased that the Board of Trustees has approved this policy which recognizes the service of many valued employees such as you who rejoined the University following a break in service.</p>
-
-                    <p>If you have any questions please feel free to contact the Human Resource Department at 801-581-6500.</p>
-
-                    <p>Thank you,</p>
-
-                    <p><strong>Benefits Department</strong><br>
-                    Hospitals and Clinics</p>
-              
-                    <p><strong><span style="color: #BE0000;">Hospitals and Clinics Human Resources</span></strong><br>
-                    525 E 100 S 1st Floor Suite 1810<br>
-                    Salt Lake City UT 84102<br>
-                    Ph 801.581.6500 | Fax 801.585.5144</p>
-                </body>
-                </html>
-                """)
-
-            mail.HTMLBody = email_body
-            mail.To = f'u{employee.employee_id[1:]}@utah.edu'
-
-            mail.Display()
+            email_body = Email.render_memo(employee)
+            Email.display_outlook_mail(Email.SUBJECT, email_body, Email.email_address(employee))
             return True
         except Exception as e:
             print(f"Failed to send email: {e}")
         return False
+
+
+# Stages timed while profiling is enabled, see Profiler in bridge_in_service_profiling
+Profiler.register(Calculation, "calculate_service_months_from_recent_start", "service_months")
+Profiler.register(Calculation, "calculate_service_months_from_recent_start_pre_16", "service_months")
+Profiler.register(Calculation, "calculate_service_months_from_bridge", "service_months")
+Profiler.register(Calculation, "calculate_service_months_from_bridge_pre_16", "service_months")
+Profiler.register(Employee, "get_fte_for_month", "fte_lookup")
+Profiler.register(Calculation, "calculate_pto_accrual_rate", "accrual_loop")
+Profiler.register(Calculation, "calculate_bridge_pto_accrual_rate", "accrual_loop")
+Profiler.register(Calculation, "calculate_accrual_differences", "differences")
+Profiler.register(Calculation, "calculate_accrual_total", "accrual_totals")
+Profiler.register(ExcelExport, "save_workbook", "excel_save")
+Profiler.register(ExcelExport, "write_file", "file_write")
+Profiler.register(Email, "display_outlook_mail", "outlook_dispatch")
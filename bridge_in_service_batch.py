@@ -0,0 +1,434 @@
+import argparse
+import csv
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import groupby
+from bridge_in_service_WIP_3 import Employee, Calculation, CalculationContext, DateOperations, Verification
+from bridge_in_service_cache import ResultCache
+from bridge_in_service_export import ExportWriter
+from bridge_in_service_profiling import Profiler, ProfileStats
+from bridge_in_service_store import EmployeeStore
+
+
+class RosterImport:
+    """
+    Reads a roster of employees from a CSV or XLSX file, or from an EmployeeStore database.
+
+    The roster has one header row and one or more rows per employee. Rows for the same
+    employee must be consecutive. The first row of an employee carries the employee details,
+    every row may carry one prior employment period and/or one FTE change.
+    """
+
+    STORE_EXTENSIONS = (".sqlite3", ".sqlite", ".db")
+
+    COLUMNS = [
+        "Employee ID", "First Name", "Last Name", "Most Recent Start Date", "FTE",
+        "Period Start", "Period End", "FTE Change Date", "New FTE"
+    ]
+
+    @staticmethod
+    def read_rows(file_path):
+        """Yield each roster row as a dictionary keyed by column title."""
+        if os.path.splitext(file_path)[1].lower() in (".xlsx", ".xlsm"):
+            import openpyxl  # Only XLSX rosters need it, CSV and store runs skip the slow import
+            wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                rows = wb.active.iter_rows(values_only=True)
+                header = [str(title).strip() if title is not None else "" for title in next(rows, ())]
+                for values in rows:
+                    if any(value is not None for value in values):
+                        yield dict(zip(header, values))
+            finally:
+                wb.close()
+        else:
+            with open(file_path, newline="", encoding="utf-8-sig") as roster_file:
+                for row in csv.DictReader(roster_file):
+                    yield {title.strip(): value for title, value in row.items() if title is not None}
+
+    @staticmethod
+    def read_employees(file_path, employee_ids=None):
+        """Yield (employee_id, rows) for each employee in the roster, in file order, optionally only the given IDs."""
+        if os.path.splitext(file_path)[1].lower() in RosterImport.STORE_EXTENSIONS:
+            # The store filters by ID itself and only loads the requested employees
+            with EmployeeStore(file_path) as store:
+                for employee in store.load_employees(employee_ids):
+                    yield employee.employee_id, RosterImport.employee_to_rows(employee)
+            return
+
+        employee_ids = set(employee_ids) if employee_ids is not None else None
+        rows = RosterImport.read_rows(file_path)
+        for employee_id, employee_rows in groupby(rows, key=lambda row: RosterImport.cell_to_text(row.get("Employee ID"))):
+            if employee_ids is None or employee_id in employee_ids:
+                yield employee_id, list(employee_rows)
+
+    @staticmethod
+    def employee_to_rows(employee):
+        """Convert an Employee to roster rows, so stored employees go through the same checks as imported ones."""
+        periods = employee.prior_employment_periods[1:]  # The first period is the current one, from the most recent start date
+        changes = employee.fte_changes[1:]  # The first change is the initial FTE
+        rows = []
+        for i in range(max(1, len(periods), len(changes))):
+            row = {"Employee ID": employee.employee_id}
+            if i == 0:
+                row["First Name"] = employee.first_name
+                row["Last Name"] = employee.last_name
+                row["Most Recent Start Date"] = employee.most_recent_start_date
+                row["FTE"] = employee.fte_changes[0][1]
+            if i < len(periods):
+                row["Period Start"], row["Period End"] = periods[i]
+            if i < len(changes):
+                row["FTE Change Date"], row["New FTE"] = changes[i]
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    def cell_to_text(value):
+        """Convert a CSV or XLSX cell to the text the Verification methods expect."""
+        if value is None:
+            return ""
+        if isinstance(value, datetime):
+            return value.strftime("%m/%d/%Y")
+        if isinstance(value, float) and value.is_integer() and value > 1:
+            # Excel stores employee IDs typed as numbers as floats
+            return str(int(value))
+        return str(value).strip()
+
+
+class BatchCalculation:
+
+    RESULT_COLUMNS = [
+        "Employee ID", "First Name", "Last Name", "Most Recent Start Date", "Bridge In Service Date",
+        "Original PTO", "Bridge PTO", "PTO Accrual Difference", "Status"
+    ]
+
+    @staticmethod
+    def build_employee(employee_id, rows):
+        """
+        Build an Employee from the roster rows of one employee, using the same checks as the GUI.
+
+        Parameters:
+        employee_id (str): The employee ID shared by all rows.
+        rows (list): The roster rows of the employee.
+
+        Returns:
+        tuple: (Employee, message), the employee is None if the rows failed validation.
+        """
+        first_row = rows[0]
+        most_recent_start_date = RosterImport.cell_to_text(first_row.get("Most Recent Start Date"))
+        fte = RosterImport.cell_to_text(first_row.get("FTE"))
+
+        valid_id, id_msg = Verification.verify_employee_id(employee_id)
+        valid_date, date_msg = Verification.verify_most_recent_start_date(most_recent_start_date)
+        valid_fte, fte_msg = Verification.verify_employee_fte(fte)
+        if not valid_id or not valid_date or not valid_fte:
+            return None, " ".join(msg for valid, msg in [(valid_id, id_msg), (valid_date, date_msg), (valid_fte, fte_msg)] if not valid)
+
+        employee = Employee(
+            employee_id,
+            RosterImport.cell_to_text(first_row.get("First Name")),
+            RosterImport.cell_to_text(first_row.get("Last Name")),
+            DateOperations.convert_to_datetime(most_recent_start_date),
+            float(fte)
+        )
+
+        for row in rows:
+            start = RosterImport.cell_to_text(row.get("Period Start"))
+            end = RosterImport.cell_to_text(row.get("Period End"))
+            if start or end:
+                start_date = DateOperations.convert_to_datetime(start)
+                end_date = DateOperations.convert_to_datetime(end)
+                if start_date is None or end_date is None:
+                    return None, f"Invalid employment period {start} - {end}. Please use MM/DD/YYYY."
+                employee.add_employment_period(start_date, end_date)
+
+            change_date = RosterImport.cell_to_text(row.get("FTE Change Date"))
+            new_fte = RosterImport.cell_to_text(row.get("New FTE"))
+            if change_date or new_fte:
+                valid_change_date, change_date_msg = Verification.verify_date(change_date)
+                if not valid_change_date:
+                    return None, f"FTE change {change_date}: {change_date_msg}"
+                valid_new_fte, new_fte_msg = Verification.verify_employee_fte(new_fte)
+                if not valid_new_fte:
+                    return None, f"FTE change {change_date}: {new_fte_msg}"
+                employee.add_fte_change(DateOperations.convert_to_datetime(change_date), float(new_fte))
+
+        return employee, "Valid employee."
+
+    @staticmethod
+    def employee_result(employee_id, rows, status):
+        """Return a result row with the employee details from the roster and a status."""
+        return {
+            "Employee ID": employee_id,
+            "First Name": RosterImport.cell_to_text(rows[0].get("First Name")),
+            "Last Name": RosterImport.cell_to_text(rows[0].get("Last Name")),
+            "Most Recent Start Date": RosterImport.cell_to_text(rows[0].get("Most Recent Start Date")),
+            "Status": status
+        }
+
+    @staticmethod
+    def calculated_result(employee_id, rows, employee, totals):
+        """Return the result row of a calculated employee."""
+        total_original, total_bridge, total_difference = totals
+        result = BatchCalculation.employee_result(employee_id, rows, "OK")
+        result["Bridge In Service Date"] = employee.bridge_in_service_date.strftime("%m/%d/%Y")
+        result["Original PTO"] = f"{total_original:.2f}"
+        result["Bridge PTO"] = f"{total_bridge:.2f}"
+        result["PTO Accrual Difference"] = f"{total_difference:.2f}"
+        return result
+
+    @staticmethod
+    def calculate_employee_result(employee_id, rows, accrual_engine=None):
+        """Calculate one employee and return a result row; failures are reported in the Status column."""
+        try:
+            employee, message = BatchCalculation.build_employee(employee_id, rows)
+            if employee is None:
+                return BatchCalculation.employee_result(employee_id, rows, message)
+            if accrual_engine is None:
+                # Only the totals are written, so skip the month by month accruals
+                _, *totals = Calculation.calculate_employee_totals(employee)
+            else:
+                totals = Calculation.calculate_employee(employee, accrual_engine)
+        except Exception as e:
+            return BatchCalculation.employee_result(employee_id, rows, f"Failed to calculate: {e}")
+        return BatchCalculation.calculated_result(employee_id, rows, employee, totals)
+
+    @staticmethod
+    def calculate_and_export_result(employee_id, rows, accrual_engine, writer):
+        """
+        Calculate one employee with its monthly accruals, render its workbook and queue it on an ExportWriter.
+
+        Returns:
+        tuple: (result row, Future of the workbook write or None if the employee failed).
+        """
+        try:
+            employee, message = BatchCalculation.build_employee(employee_id, rows)
+            if employee is None:
+                return BatchCalculation.employee_result(employee_id, rows, message), None
+            totals = Calculation.calculate_employee(employee, accrual_engine)
+        except Exception as e:
+            return BatchCalculation.employee_result(employee_id, rows, f"Failed to calculate: {e}"), None
+        try:
+            future = writer.submit_employee(employee)
+        except Exception as e:
+            return BatchCalculation.employee_result(employee_id, rows, f"Failed to export: {e}"), None
+        return BatchCalculation.calculated_result(employee_id, rows, employee, totals), future
+
+    @staticmethod
+    def export_status(result, future):
+        """Wait for an employee's workbook to be written and report a failed write in the Status column."""
+        if future is not None:
+            try:
+                future.result()
+            except Exception as e:
+                result["Status"] = f"Failed to export: {e}"
+        return result
+
+    @staticmethod
+    def export_results(employees, accrual_engine, export_dir):
+        """
+        Calculate (employee_id, rows) pairs and export a workbook per employee under export_dir.
+
+        Workbooks are rendered here and written by an ExportWriter's threads. Result rows are
+        yielded in order once their workbook is written, so the Status column covers the export.
+        """
+        with ExportWriter(export_dir) as writer:
+            pending = deque()
+            for employee_id, rows in employees:
+                pending.append(BatchCalculation.calculate_and_export_result(employee_id, rows, accrual_engine, writer))
+                while pending and (pending[0][1] is None or pending[0][1].done()):
+                    yield BatchCalculation.export_status(*pending.popleft())
+            while pending:
+                yield BatchCalculation.export_status(*pending.popleft())
+
+    @staticmethod
+    def calculate_roster(roster_path, as_of_date=None, employee_ids=None, cache_dir=None, export_dir=None):
+        """
+        Calculate every employee in a roster, yielding one result row per employee as soon as it is done.
+
+        Parameters:
+        roster_path (str): Path to the CSV or XLSX roster, or to an EmployeeStore database.
+        as_of_date (datetime): Date to calculate as of. Defaults to today, pinned for the whole run.
+        employee_ids (iterable): Only calculate these employees. Defaults to the whole roster.
+        cache_dir (str): Reuse accruals cached in this directory by earlier runs for the same date.
+        export_dir (str): Also export a workbook per employee to this directory.
+        """
+        accrual_engine = ResultCache(cache_dir=cache_dir) if cache_dir else None
+        # The date is pinned only while results are calculated, not while the caller handles them
+        context = CalculationContext(as_of_date or DateOperations.get_todays_date())
+        employees = RosterImport.read_employees(roster_path, employee_ids)
+        if export_dir:
+            results = BatchCalculation.export_results(employees, accrual_engine, export_dir)
+        else:
+            results = (BatchCalculation.calculate_employee_result(employee_id, rows, accrual_engine) for employee_id, rows in employees)
+        yield from context.iterate(results)
+
+    @staticmethod
+    def calculate_chunk(chunk, as_of_date, cache_dir=None, profile_stats=None, export_dir=None):
+        """
+        Calculate a list of (employee_id, rows) in a worker process.
+
+        Returns (results, profile_stats). If the parent is profiling it passes an empty ProfileStats,
+        which comes back filled in with the worker's timings; otherwise profile_stats is None.
+        """
+        # Workers share cached accruals through the cache directory
+        accrual_engine = ResultCache(cache_dir=cache_dir) if cache_dir else None
+        if profile_stats is not None:
+            # A forked worker starts with the parent's profiler enabled, record into this chunk's stats instead
+            Profiler.disable()
+            Profiler.enable(stats=profile_stats)
+        try:
+            # Workers do not share the parent's context, so the date is passed along with each chunk
+            with CalculationContext(as_of_date).activate():
+                if export_dir:
+                    return list(BatchCalculation.export_results(chunk, accrual_engine, export_dir)), profile_stats
+                return [BatchCalculation.calculate_employee_result(employee_id, rows, accrual_engine) for employee_id, rows in chunk], profile_stats
+        finally:
+            if profile_stats is not None:
+                Profiler.disable()
+
+    @staticmethod
+    def chunk_results(chunk, future):
+        """Return the results of a finished chunk, or a failed result per employee if its worker failed."""
+        try:
+            results, profile_stats = future.result()
+            if profile_stats is not None and Profiler.is_enabled():
+                Profiler.stats.merge(profile_stats)
+            return results
+        except Exception as e:
+            return [BatchCalculation.employee_result(employee_id, rows, f"Failed to calculate: {e}") for employee_id, rows in chunk]
+
+    @staticmethod
+    def calculate_roster_parallel(roster_path, as_of_date=None, workers=None, chunk_size=200, employee_ids=None, cache_dir=None, export_dir=None):
+        """
+        Calculate a roster across a pool of worker processes, yielding result rows in roster order.
+
+        Parameters:
+        roster_path (str): Path to the CSV or XLSX roster, or to an EmployeeStore database.
+        as_of_date (datetime): Date to calculate as of. Defaults to today, pinned for the whole run.
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+        chunk_size (int): Number of employees sent to a worker at a time.
+        employee_ids (iterable): Only calculate these employees. Defaults to the whole roster.
+        cache_dir (str): Reuse accruals cached in this directory by earlier runs for the same date.
+        export_dir (str): Also export a workbook per employee to this directory.
+        """
+        as_of_date = as_of_date or DateOperations.get_todays_date()
+        workers = workers or os.cpu_count() or 1
+        # Only a few chunks per worker are read ahead, so memory stays flat however long the roster is
+        max_pending = workers * 2
+        # When profiling, the workers time their own calculations and the parent merges them in
+        profile_trace = Profiler.stats.trace if Profiler.is_enabled() else None
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            def submit(chunk):
+                profile_stats = ProfileStats(profile_trace) if profile_trace is not None else None
+                return chunk, executor.submit(BatchCalculation.calculate_chunk, chunk, as_of_date, cache_dir, profile_stats, export_dir)
+
+            pending = deque()
+            chunk = []
+            for employee in RosterImport.read_employees(roster_path, employee_ids):
+                chunk.append(employee)
+                if len(chunk) < chunk_size:
+                    continue
+                pending.append(submit(chunk))
+                chunk = []
+                while len(pending) >= max_pending:
+                    yield from BatchCalculation.chunk_results(*pending.popleft())
+            if chunk:
+                pending.append(submit(chunk))
+            while pending:
+                yield from BatchCalculation.chunk_results(*pending.popleft())
+
+    @staticmethod
+    def try_import_roster(roster_path, store_path):
+        """Save every valid employee of a CSV or XLSX roster to an EmployeeStore database."""
+        try:
+            imported = failed = 0
+            with EmployeeStore(store_path) as store:
+                for employee_id, rows in RosterImport.read_employees(roster_path):
+                    employee, message = BatchCalculation.build_employee(employee_id, rows)
+                    if employee is None:
+                        print(f"Skipped employee {employee_id}: {message}", file=sys.stderr)
+                        failed += 1
+                        continue
+                    store.save_employee(employee)
+                    imported += 1
+            print(f"Imported {imported} employees ({failed} skipped).", file=sys.stderr)
+            return True
+        except Exception as e:
+            print(f"Failed to import roster: {e}", file=sys.stderr)
+            return False
+
+    @staticmethod
+    def write_results(results, output_file):
+        """Stream result rows to a CSV file object and return (processed, failed) counts."""
+        writer = csv.DictWriter(output_file, fieldnames=BatchCalculation.RESULT_COLUMNS)
+        writer.writeheader()
+        processed = failed = 0
+        for result in results:
+            writer.writerow(result)
+            processed += 1
+            if result["Status"] != "OK":
+                failed += 1
+        return processed, failed
+
+    @staticmethod
+    def try_process_roster(roster_path, output_path, as_of_date=None, workers=1, chunk_size=200, employee_ids=None, cache_dir=None, export_dir=None):
+        try:
+            if workers == 1:
+                results = BatchCalculation.calculate_roster(roster_path, as_of_date, employee_ids, cache_dir, export_dir)
+            else:
+                results = BatchCalculation.calculate_roster_parallel(roster_path, as_of_date, workers, chunk_size, employee_ids, cache_dir, export_dir)
+            if output_path == "-":
+                processed, failed = BatchCalculation.write_results(results, sys.stdout)
+            else:
+                with open(output_path, "w", newline="", encoding="utf-8") as output_file:
+                    processed, failed = BatchCalculation.write_results(results, output_file)
+            print(f"Processed {processed} employees ({failed} failed).", file=sys.stderr)
+            return True
+        except Exception as e:
+            print(f"Failed to process roster: {e}", file=sys.stderr)
+            return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calculate bridge in service dates and PTO differences for a whole roster.")
+    parser.add_argument("roster", help="CSV or XLSX roster with the columns: " + ", ".join(RosterImport.COLUMNS) + ", or an employee store (.sqlite3)")
+    parser.add_argument("output", help="CSV file to write the results to, or - for standard output. With --import, the employee store to save the roster to")
+    parser.add_argument("--import", dest="import_roster", action="store_true", help="Save the roster's employees to an employee store instead of calculating")
+    parser.add_argument("--employee", action="append", dest="employee_ids", metavar="ID", help="Only calculate this employee, can be repeated")
+    parser.add_argument("--as-of", help="Calculate as of this date (MM/DD/YYYY) instead of today")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes, 0 for one per CPU (default: 1)")
+    parser.add_argument("--cache-dir", help="Directory to cache accruals in, reused by later runs for the same date")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Employees sent to a worker at a time (default: 200)")
+    parser.add_argument("--export-dir", help="Also export a workbook per employee to this directory, for example the HR file share")
+    parser.add_argument("--profile", action="store_true", help="Print call counts and timings per calculation stage when done")
+    parser.add_argument("--trace", metavar="PATH", help="Write a Chrome trace (chrome://tracing, Perfetto) of every timed call, implies --profile")
+    args = parser.parse_args(argv)
+    if args.workers < 0 or args.chunk_size < 1:
+        parser.error("--workers must be 0 or more and --chunk-size at least 1.")
+
+    if args.import_roster:
+        return 0 if BatchCalculation.try_import_roster(args.roster, args.output) else 1
+
+    as_of_date = None
+    if args.as_of:
+        as_of_date = DateOperations.convert_to_datetime(args.as_of)
+        if as_of_date is None:
+            parser.error("Invalid --as-of date. Please use MM/DD/YYYY.")
+
+    if args.profile or args.trace:
+        Profiler.enable(trace=bool(args.trace))
+    success = BatchCalculation.try_process_roster(args.roster, args.output, as_of_date, args.workers, args.chunk_size, args.employee_ids, args.cache_dir, args.export_dir)
+    if args.profile or args.trace:
+        stats = Profiler.disable()
+        print(stats.report(), file=sys.stderr)
+        if args.trace and not stats.try_write_chrome_trace(args.trace):
+            success = False
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from bridge_in_service_WIP_3 import Employee, Calculation, CalculationContext, DateOperations, ExcelExport
+
+
+class SyntheticRoster:
+    """Deterministic synthetic employees for benchmarking, the same index and seed always give the same employee."""
+
+    FTE_VALUES = [0.75, 0.8, 0.85, 0.9, 0.95, 1.0]
+
+    @staticmethod
+    def employee(index, as_of_date, tenure_years, period_count, fte_change_count, seed=0):
+        """
+        Create an employee with about tenure_years of service split over the current and period_count
+        prior employment periods, and fte_change_count FTE changes since the most recent start date.
+        """
+        rnd = random.Random(seed * 1000003 + index)
+        service_days = max(int(tenure_years * 365), 200 * (period_count + 1))
+        # Split the service into the current period and the prior ones, the current period at least 200 days
+        cuts = sorted(rnd.randint(1, service_days - 1) for _ in range(period_count))
+        lengths = [b - a for a, b in zip([0] + cuts, cuts + [service_days])]
+        lengths = [max(length, 1) for length in lengths]
+        lengths[-1] = max(lengths[-1], 200)
+
+        most_recent_start_date = as_of_date.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=lengths[-1])
+        employee = Employee(f"{10000000 + index % 90000000}", "Test", f"Employee{index}", most_recent_start_date,
+                            rnd.choice(SyntheticRoster.FTE_VALUES))
+
+        period_end = most_recent_start_date
+        for length in reversed(lengths[:-1]):
+            period_end -= timedelta(days=rnd.randint(30, 400))  # Break in service
+            period_start = period_end - timedelta(days=length)
+            employee.add_employment_period(period_start, period_end)
+            period_end = period_start
+
+        for _ in range(fte_change_count):
+            change_date = most_recent_start_date + timedelta(days=rnd.randint(0, lengths[-1]))
+            employee.add_fte_change(change_date, rnd.choice(SyntheticRoster.FTE_VALUES))
+        return employee
+
+    @staticmethod
+    def employees(count, as_of_date, tenure_years, period_count, fte_change_count, seed=0):
+
+        for index in range(count):
+            yield SyntheticRoster.employee(index, as_of_date, tenure_years, period_count, fte_change_count, seed)
+
+
+class Benchmark:
+
+    BATCH_SIZE = 500
+
+    @staticmethod
+    def prepare_bridge(employee):
+
+        Calculation.calculate_bridge_in_service_date(employee)
+        return (employee,)
+
+    @staticmethod
+    def prepare_differences(employee):
+
+        Calculation.calculate_bridge_in_service_date(employee)
+        _, original_monthly_accruals = Calculation.calculate_pto_accrual_rate(employee)
+        _, bridge_monthly_accruals = Calculation.calculate_bridge_pto_accrual_rate(employee)
+        return original_monthly_accruals, bridge_monthly_accruals
+
+    @staticmethod
+    def prepare_export(employee, directory_path):
+
+        Calculation.calculate_employee(employee)
+        return (employee, directory_path, employee.original_monthly_accruals,
+                employee.bridge_monthly_accruals, employee.accrual_differences)
+
+    @staticmethod
+    def stages(directory_path):
+        """Return (name, function, prepare) for each timed function; prepare builds the arguments untimed."""
+        return [
+            ("calculate_bridge_in_service_date", Calculation.calculate_bridge_in_service_date, lambda employee: (employee,)),
+            ("calculate_pto_accrual_rate", Calculation.calculate_pto_accrual_rate, Benchmark.prepare_bridge),
+            ("calculate_bridge_pto_accrual_rate", Calculation.calculate_bridge_pto_accrual_rate, Benchmark.prepare_bridge),
+            ("calculate_accrual_differences", Calculation.calculate_accrual_differences, Benchmark.prepare_differences),
+            ("calculate_employee_totals", Calculation.calculate_employee_totals, lambda employee: (employee,)),
+            ("try_export_employee_data", ExcelExport.try_export_employee_data,
+             lambda employee: Benchmark.prepare_export(employee, directory_path)),
+        ]
+
+    @staticmethod
+    def time_stage(function, prepare, employees):
+        """
+        Time function over all employees, preparing the arguments in untimed batches so memory stays
+        bounded and the timer overhead is paid once per batch rather than once per call.
+        """
+        seconds = 0.0
+        count = 0
+        batch = []
+        for employee in employees:
+            batch.append(prepare(employee))
+            if len(batch) == Benchmark.BATCH_SIZE:
+                seconds += Benchmark.time_batch(function, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            seconds += Benchmark.time_batch(function, batch)
+            count += len(batch)
+        return seconds, count
+
+    @staticmethod
+    def time_batch(function, batch):
+
+        with contextlib.redirect_stdout(io.StringIO()):  # The export prints a line per file
+            start = time.perf_counter()
+            for arguments in batch:
+                function(*arguments)
+            return time.perf_counter() - start
+
+    @staticmethod
+    def run(scales, as_of_date, tenure_years, period_count, fte_change_count, seed=0, max_export=100, repeat=1, functions=None):
+        """
+        Time every stage at every scale and return the results as a JSON-serializable dictionary.
+        The best of repeat runs is kept. Exports are only timed up to max_export employees.
+        """
+        results = []
+        with CalculationContext(as_of_date).activate():
+            with tempfile.TemporaryDirectory() as directory_path:
+                for name, function, prepare in Benchmark.stages(directory_path):
+                    if functions and name not in functions:
+                        continue
+                    for scale in scales:
+                        if function is ExcelExport.try_export_employee_data and scale > max_export:
+                            continue
+                        best = None
+                        for _ in range(repeat):
+                            employees = SyntheticRoster.employees(scale, as_of_date, tenure_years, period_count, fte_change_count, seed)
+                            seconds, count = Benchmark.time_stage(function, prepare, employees)
+                            best = seconds if best is None else min(best, seconds)
+                        results.append({
+                            "function": name,
+                            "employees": count,
+                            "seconds": best,
+                            "microseconds_per_employee": best / count * 1e6 if count else 0.0
+                        })
+                        print(f"{name:<36} {count:>8} employees {best:>10.4f} s {results[-1]['microseconds_per_employee']:>12.1f} us/employee", file=sys.stderr)
+
+        return {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "parameters": {
+                "as_of_date": as_of_date.strftime("%m/%d/%Y"),
+                "tenure_years": tenure_years,
+                "employment_periods": period_count,
+                "fte_changes": fte_change_count,
+                "seed": seed,
+                "repeat": repeat
+            },
+            "results": results
+        }
+
+    STARTUP_MODULES = ["bridge_in_service_WIP_3", "bridge_in_service_batch", "BridgeInServiceGUI"]
+    HEAVY_MODULES = ["openpyxl", "numpy", "win32com", "pythoncom", "PyQt5"]
+
+    STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+    @staticmethod
+    def measure_startup(modules=None, repeat=3):
+        """
+        Time importing each entry point module in a fresh interpreter, the best of repeat runs,
+        and list the heavy optional dependencies the import loaded.
+        """
+        results = []
+        directory_path = os.path.dirname(os.path.abspath(__file__))
+        for module in modules or Benchmark.STARTUP_MODULES:
+            script = Benchmark.STARTUP_SCRIPT.format(module=module, heavy=Benchmark.HEAVY_MODULES)
+            best = None
+            for _ in range(repeat):
+                completed = subprocess.run([sys.executable, "-c", script], cwd=directory_path, capture_output=True, text=True)
+                if completed.returncode != 0:
+                    best = {"seconds": None, "loaded": [], "error": completed.stderr.strip().splitlines()[-1]}
+                    break
+                startup = json.loads(completed.stdout.strip().splitlines()[-1])
+                if best is None or startup["seconds"] < best["seconds"]:
+                    best = startup
+            results.append({"module": module, **best})
+            if best["seconds"] is None:
+                print(f"{module:<36} failed: {best['error']}", file=sys.stderr)
+            else:
+                print(f"{module:<36} {best['seconds'] * 1000:>8.1f} ms  loaded: {', '.join(best['loaded']) or 'none'}", file=sys.stderr)
+        return results
+
+    @staticmethod
+    def compare(results, baseline):
+        """Print how each timing changed against a baseline run with the same parameters."""
+        baseline_times = {(result["function"], result["employees"]): result["seconds"] for result in baseline["results"]}
+        if baseline["parameters"] != results["parameters"]:
+            print("Warning: the baseline was run with different parameters.", file=sys.stderr)
+        for result in results["results"]:
+            baseline_seconds = baseline_times.get((result["function"], result["employees"]))
+            if baseline_seconds:
+                change = (result["seconds"] / baseline_seconds - 1) * 100
+                print(f"{result['function']:<36} {result['employees']:>8} employees {change:>+8.1f} %", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bridge in service calculations on synthetic employees.")
+    parser.add_argument("--scales", default="1,10,100,1000,10000,100000", help="Comma separated employee counts (default: 1 to 100000)")
+    parser.add_argument("--as-of", default="06/30/2025", help="Pinned calculation date, MM/DD/YYYY (default: 06/30/2025)")
+    parser.add_argument("--tenure", type=float, default=20, help="Years of service per employee (default: 20)")
+    parser.add_argument("--periods", type=int, default=3, help="Prior employment periods per employee (default: 3)")
+    parser.add_argument("--fte-changes", type=int, default=5, help="FTE changes per employee (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic employees (default: 0)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per measurement, the best is kept (default: 1)")
+    parser.add_argument("--max-export", type=int, default=100, help="Largest scale to time the Excel export at (default: 100)")
+    parser.add_argument("--function", action="append", dest="functions", help="Only time this function, can be repeated")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare against the results in this JSON file")
+    parser.add_argument("--startup", action="store_true", help="Also time importing the GUI, batch and calculation modules in a fresh interpreter")
+    args = parser.parse_args(argv)
+
+    as_of_date = DateOperations.convert_to_datetime(args.as_of)
+    if as_of_date is None:
+        parser.error("Invalid --as-of date. Please use MM/DD/YYYY.")
+    scales = [int(scale) for scale in args.scales.split(",")]
+
+    results = Benchmark.run(scales, as_of_date, args.tenure, args.periods, args.fte_changes,
+                            args.seed, args.max_export, args.repeat, args.functions)
+    if args.startup:
+        results["startup"] = Benchmark.measure_startup(repeat=max(args.repeat, 3))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            Benchmark.compare(results, json.load(baseline_file))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from bridge_in_service_WIP_3 import AccrualPolicy, Calculation, CalculationContext, DateOperations, MonthlyAccruals
+
+
+class ResultCache:
+    """
+    Content-addressed cache for the results of calculate_pto_accrual_rate and
+    calculate_bridge_pto_accrual_rate.
+
+    The key is a hash of everything the accruals depend on: today's date (DateOperations.get_todays_date(),
+    without the time of day, which does not change the accruals), the accrual policy, the most recent start date,
+    the FTE changes and, for the bridge accruals, the date of the bridge in service (which sums up the employment periods).
+    Entries are kept in memory with least recently used eviction and, if a cache directory is given, also as JSON
+    files so later runs and other processes can reuse them. A cache can be shared by threads, for example through
+    a CalculationContext; two threads missing the same entry at once both calculate it.
+
+    Use it anywhere Calculation's accrual functions are used, for example
+    Calculation.calculate_employee(employee, accrual_engine=ResultCache()).
+    """
+
+    def __init__(self, max_entries=10000, cache_dir=None, accrual_engine=None):
+
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.accrual_engine = accrual_engine or Calculation
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # Guards entries and the counters
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(employee, bridge):
+
+        history = [
+            "bridge" if bridge else "original",
+            DateOperations.get_todays_date().date().isoformat(),
+            employee.most_recent_start_date.isoformat(),
+            # Like today, only the date counts; the time carries microseconds between reads of the clock
+            employee.bridge_in_service_date.date().isoformat() if bridge else None,
+            # In the order entered, the first change is the initial FTE and ties go to the latest entered
+            [(change_date.isoformat(), new_fte) for change_date, new_fte in employee.fte_changes]
+        ]
+        policy = CalculationContext.active_policy()
+        if policy != AccrualPolicy.DEFAULT:
+            # Only other policies are added, so entries cached with the default policy keep their keys
+            history.append([policy.thresholds, policy.rates])
+        return hashlib.sha256(json.dumps(history).encode("utf-8")).hexdigest()
+
+    def stats(self):
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries)
+            }
+
+    def clear(self):
+
+        with self.lock:
+            self.entries.clear()
+
+    def read_disk_entry(self, key):
+
+        try:
+            with open(os.path.join(self.cache_dir, f"{key}.json"), encoding="utf-8") as entry_file:
+                entry = json.load(entry_file)
+            return entry["total"], entry["months"], entry["ftes"], entry["hours"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def write_disk_entry(self, key, entry):
+
+        total, months, ftes, hours = entry
+        file_path = os.path.join(self.cache_dir, f"{key}.json")
+        temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as entry_file:
+                json.dump({"total": total, "months": months, "ftes": ftes, "hours": hours}, entry_file)
+            # Replace in one step so other processes never read a partial entry
+            os.replace(temp_path, file_path)
+        except OSError as e:
+            print(f"Failed to write cache entry: {e}")
+
+    def remember(self, key, entry):
+        # Called with self.lock held
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def cached_accruals(self, employee, bridge):
+
+        key = ResultCache.fingerprint(employee, bridge)
+        with self.lock:
+            entry = self.entries.get(key)
+        disk_hit = False
+        if entry is None and self.cache_dir:
+            entry = self.read_disk_entry(key)
+            disk_hit = entry is not None
+
+        if entry is not None:
+            with self.lock:
+                self.remember(key, entry)
+                self.hits += 1
+                self.disk_hits += disk_hit
+        else:
+            # Calculated outside the lock, so other threads are not held up meanwhile
+            if bridge:
+                total, accruals = self.accrual_engine.calculate_bridge_pto_accrual_rate(employee)
+            else:
+                total, accruals = self.accrual_engine.calculate_pto_accrual_rate(employee)
+            entry = (total, accruals.months[:], accruals.ftes[:], accruals.hours[:])
+            with self.lock:
+                self.remember(key, entry)
+                self.misses += 1
+            if self.cache_dir:
+                self.write_disk_entry(key, entry)
+
+        # Hand out a copy so callers cannot change the cached entry
+        total, months, ftes, hours = entry
+        return total, MonthlyAccruals(months[:], ftes[:], hours[:])
+
+    def calculate_pto_accrual_rate(self, employee):
+
+        return self.cached_accruals(employee, bridge=False)
+
+    def calculate_bridge_pto_accrual_rate(self, employee):
+
+        return self.cached_accruals(employee, bridge=True)
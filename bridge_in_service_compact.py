@@ -0,0 +1,135 @@
+from array import array
+from datetime import datetime, timedelta
+from bridge_in_service_WIP_3 import Employee, EmploymentPeriodIndex, MonthlyAccruals
+
+
+class CompactDates:
+    """
+    Dates stored as 64-bit integer microseconds since 1970-01-01, the layout of numpy.datetime64[us],
+    so array("q") columns of them can be viewed with numpy.frombuffer(dates, dtype="datetime64[us]")
+    without copying. The time of day is kept: today's date carries it into the current employment
+    period and the bridge in service date.
+    """
+
+    EPOCH = datetime(1970, 1, 1)
+    MICROSECOND = timedelta(microseconds=1)
+
+    @staticmethod
+    def to_int(date):
+
+        return (date - CompactDates.EPOCH) // CompactDates.MICROSECOND
+
+    @staticmethod
+    def from_int(value):
+
+        return CompactDates.EPOCH + timedelta(microseconds=value)
+
+
+class CompactAccruals:
+    """
+    MonthlyAccruals held in typed arrays: month ordinals as 32-bit integers, FTEs and hours as doubles.
+    Differences have no FTE, for them ftes is None.
+    """
+
+    __slots__ = ("months", "ftes", "hours")
+
+    def __init__(self, months, ftes, hours):
+
+        self.months = months
+        self.ftes = ftes
+        self.hours = hours
+
+    def __len__(self):
+
+        return len(self.months)
+
+    @staticmethod
+    def from_monthly_accruals(accruals):
+        """Return the accruals as CompactAccruals, or None if there are none (so totals-only employees store nothing)."""
+        if not accruals.months:
+            return None
+        ftes = None if accruals.ftes[0] is None else array("d", accruals.ftes)
+        return CompactAccruals(array("i", accruals.months), ftes, array("d", accruals.hours))
+
+    @staticmethod
+    def to_monthly_accruals(compact_accruals):
+
+        if compact_accruals is None:
+            return MonthlyAccruals()
+        hours = compact_accruals.hours.tolist()
+        ftes = compact_accruals.ftes.tolist() if compact_accruals.ftes is not None else [None] * len(hours)
+        return MonthlyAccruals(compact_accruals.months.tolist(), ftes, hours)
+
+
+class CompactEmployee:
+    """
+    Memory-compact copy of an Employee and its results, for holding a whole workforce in one process.
+
+    Employment periods and FTE changes are flat typed arrays instead of lists of tuples of
+    datetimes, and the monthly accruals are CompactAccruals instead of lists of Python ints and
+    floats, roughly a fifth of the memory. Convert with CompactEmployee.from_employee and
+    to_employee; the round trip gives back an equal Employee, including the end of the current
+    employment period (today when the employee was created), so results do not change.
+
+    period_dates holds start, end, start, end, ... of every employment period in the order
+    added, the current period first. fte_change_dates and fte_change_ftes hold the FTE changes
+    in the order entered, the initial FTE first.
+    """
+
+    __slots__ = ("employee_id", "first_name", "last_name", "period_dates", "fte_change_dates", "fte_change_ftes",
+                 "bridge_in_service_date", "pto_accrual_difference",
+                 "original_monthly_accruals", "bridge_monthly_accruals", "accrual_differences")
+
+    @staticmethod
+    def from_employee(employee):
+
+        compact = CompactEmployee()
+        compact.employee_id = employee.employee_id
+        compact.first_name = employee.first_name
+        compact.last_name = employee.last_name
+        compact.period_dates = array("q", [CompactDates.to_int(date) for period in employee.prior_employment_periods for date in period])
+        compact.fte_change_dates = array("q", [CompactDates.to_int(change_date) for change_date, _ in employee.fte_changes])
+        compact.fte_change_ftes = array("d", [new_fte for _, new_fte in employee.fte_changes])
+        compact.bridge_in_service_date = (CompactDates.to_int(employee.bridge_in_service_date)
+                                          if employee.bridge_in_service_date is not None else None)
+        compact.pto_accrual_difference = employee.pto_accrual_difference
+        compact.original_monthly_accruals = CompactAccruals.from_monthly_accruals(employee.original_monthly_accruals)
+        compact.bridge_monthly_accruals = CompactAccruals.from_monthly_accruals(employee.bridge_monthly_accruals)
+        compact.accrual_differences = CompactAccruals.from_monthly_accruals(employee.accrual_differences)
+        return compact
+
+    @property
+    def most_recent_start_date(self):
+
+        return CompactDates.from_int(self.period_dates[0])
+
+    def employment_periods(self):
+        """Return the employment periods as (start_date, end_date) datetimes, like Employee.prior_employment_periods."""
+        dates = [CompactDates.from_int(value) for value in self.period_dates]
+        return list(zip(dates[0::2], dates[1::2]))
+
+    def fte_changes(self):
+        """Return the FTE changes as (change_date, new_fte), like Employee.fte_changes."""
+        return [(CompactDates.from_int(change_date), new_fte) for change_date, new_fte in zip(self.fte_change_dates, self.fte_change_ftes)]
+
+    def to_employee(self):
+
+        periods = self.employment_periods()
+        fte_changes = self.fte_changes()
+        most_recent_start_date, current_end_date = periods[0]
+        employee = Employee(self.employee_id, self.first_name, self.last_name, most_recent_start_date, fte_changes[0][1])
+        # Employee ends the current period today, keep the end it had when it was compacted
+        employee.prior_employment_periods[0] = (most_recent_start_date, current_end_date)
+        employee.employment_period_index = EmploymentPeriodIndex(employee.prior_employment_periods)
+        for start_date, end_date in periods[1:]:
+            employee.add_employment_period(start_date, end_date)
+        for change_date, new_fte in fte_changes[1:]:
+            employee.add_fte_change(change_date, new_fte)
+
+        if self.bridge_in_service_date is not None:
+            employee.set_bridge_in_service_date(CompactDates.from_int(self.bridge_in_service_date))
+        employee.update_pto_accrual_difference(self.pto_accrual_difference)
+        employee.original_monthly_accruals = CompactAccruals.to_monthly_accruals(self.original_monthly_accruals)
+        employee.bridge_monthly_accruals = CompactAccruals.to_monthly_accruals(self.bridge_monthly_accruals)
+        employee.accrual_differences = CompactAccruals.to_monthly_accruals(self.accrual_differences)
+        return employee
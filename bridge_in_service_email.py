@@ -0,0 +1,261 @@
+import argparse
+import os
+import smtplib
+import sys
+from email.message import EmailMessage
+from bridge_in_service_WIP_3 import Calculation, CalculationContext, DateOperations, Email
+from bridge_in_service_profiling import Profiler
+
+
+class Memo:
+    """A rendered bridge in service memo, ready for any transport."""
+
+    __slots__ = ("employee_id", "file_name", "to", "subject", "html_body")
+
+    def __init__(self, employee_id, file_name, to, subject, html_body):
+
+        self.employee_id = employee_id
+        self.file_name = file_name
+        self.to = to
+        self.subject = subject
+        self.html_body = html_body
+
+    def to_email_message(self, sender):
+
+        message = EmailMessage()
+        message["Subject"] = self.subject
+        message["From"] = sender
+        message["To"] = self.to
+        message.set_content(self.html_body, subtype="html")
+        return message
+
+
+class OutlookTransport:
+    """
+    Creates the memos in Outlook over one COM connection for the whole batch.
+    With display=True each memo is opened for review like Email.try_send_email, otherwise it is sent.
+    """
+
+    def __init__(self, display=False):
+
+        self.display = display
+        self.outlook = None
+
+    def __enter__(self):
+
+        # pywin32 is only needed (and only available on Windows) for this transport
+        import win32com.client as win32
+        self.outlook = win32.Dispatch('outlook.application')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.outlook = None
+
+    def send(self, memo):
+
+        mail = self.outlook.CreateItem(0)
+        mail.Subject = memo.subject
+        mail.HTMLBody = memo.html_body
+        mail.To = memo.to
+        if self.display:
+            mail.Display()
+        else:
+            mail.Send()
+
+
+class SmtpTransport:
+    """
+    Sends the memos over one SMTP connection, reconnecting after messages_per_connection
+    messages (servers often limit this) or if the server drops the connection.
+    """
+
+    def __init__(self, host, port=25, sender="benefits@utah.edu", username=None, password=None,
+                 starttls=False, messages_per_connection=100, timeout=60):
+
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.messages_per_connection = messages_per_connection
+        self.timeout = timeout
+        self.connection = None
+        self.messages_sent = 0
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.disconnect()
+
+    def connect(self):
+
+        self.connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            self.connection.starttls()
+        if self.username:
+            self.connection.login(self.username, self.password)
+        self.messages_sent = 0
+
+    def disconnect(self):
+
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except smtplib.SMTPException:
+                self.connection.close()
+            self.connection = None
+
+    def send(self, memo):
+
+        if self.connection is not None and self.messages_sent >= self.messages_per_connection:
+            self.disconnect()
+        if self.connection is None:
+            self.connect()
+
+        message = memo.to_email_message(self.sender)
+        try:
+            self.connection.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # The server closed an idle or used up connection, send once more over a new one
+            self.connection = None
+            self.connect()
+            self.connection.send_message(message)
+        self.messages_sent += 1
+
+
+class SpoolTransport:
+    """Writes each memo as an .eml file to a directory, to be reviewed or sent by another system."""
+
+    def __init__(self, directory_path, sender="benefits@utah.edu"):
+
+        self.directory_path = directory_path
+        self.sender = sender
+
+    def __enter__(self):
+
+        os.makedirs(self.directory_path, exist_ok=True)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        pass
+
+    def send(self, memo):
+
+        file_path = os.path.join(self.directory_path, f"{memo.file_name}.eml")
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as eml_file:
+            eml_file.write(memo.to_email_message(self.sender).as_bytes())
+        # Replace in one step so a spool reader never picks up a partial message
+        os.replace(temp_path, file_path)
+
+
+class BulkEmail:
+
+    @staticmethod
+    def render_memos(employees, memo_date=None):
+        """
+        Yield a Memo for each calculated employee, with the template and date shared by the whole batch.
+
+        Parameters:
+        employees (iterable): Employees with the bridge in service date and PTO accrual difference calculated.
+        memo_date (str): The date shown on the memos (MM/DD/YYYY). Defaults to today.
+        """
+        memo_date = memo_date or DateOperations.get_todays_date().strftime("%m/%d/%Y")
+        for employee in employees:
+            yield Memo(
+                employee.employee_id,
+                f"{employee.employee_id} {employee.last_name}, {employee.first_name} Bridge In Service",
+                Email.email_address(employee),
+                Email.SUBJECT,
+                Email.render_memo(employee, memo_date)
+            )
+
+    @staticmethod
+    def try_send_memos(memos, transport):
+        """
+        Send every memo through a transport, reporting failures per memo instead of stopping the batch.
+
+        Returns:
+        tuple: (sent, failed) counts.
+        """
+        sent = failed = 0
+        try:
+            with transport:
+                for memo in memos:
+                    try:
+                        transport.send(memo)
+                        sent += 1
+                    except Exception as e:
+                        print(f"Failed to send email to employee {memo.employee_id}: {e}", file=sys.stderr)
+                        failed += 1
+        except Exception as e:
+            # The transport itself failed, count it so the batch does not look successful
+            print(f"Failed to send emails: {e}", file=sys.stderr)
+            failed += 1
+        return sent, failed
+
+
+def main(argv=None):
+    # Imported here so rendering and the transports do not depend on the roster import
+    from bridge_in_service_batch import BatchCalculation, RosterImport
+
+    parser = argparse.ArgumentParser(description="Send the bridge in service memo to every employee in a roster.")
+    parser.add_argument("roster", help="CSV or XLSX roster with the columns: " + ", ".join(RosterImport.COLUMNS) + ", or an employee store (.sqlite3)")
+    transports = parser.add_mutually_exclusive_group(required=True)
+    transports.add_argument("--spool", metavar="DIRECTORY", help="Write each memo as an .eml file to this directory")
+    transports.add_argument("--smtp", metavar="HOST[:PORT]", help="Send the memos through this SMTP server over one connection")
+    transports.add_argument("--outlook", action="store_true", help="Send the memos through Outlook")
+    parser.add_argument("--sender", default="benefits@utah.edu", help="From address for --smtp and --spool (default: benefits@utah.edu)")
+    parser.add_argument("--starttls", action="store_true", help="Use STARTTLS with --smtp")
+    parser.add_argument("--employee", action="append", dest="employee_ids", metavar="ID", help="Only email this employee, can be repeated")
+    parser.add_argument("--as-of", help="Calculate as of this date (MM/DD/YYYY) instead of today")
+    args = parser.parse_args(argv)
+
+    as_of_date = DateOperations.get_todays_date()
+    if args.as_of:
+        as_of_date = DateOperations.convert_to_datetime(args.as_of)
+        if as_of_date is None:
+            parser.error("Invalid --as-of date. Please use MM/DD/YYYY.")
+
+    if args.spool:
+        transport = SpoolTransport(args.spool, args.sender)
+    elif args.smtp:
+        host, _, port = args.smtp.partition(":")
+        transport = SmtpTransport(host, int(port or 25), args.sender, os.environ.get("SMTP_USERNAME"), os.environ.get("SMTP_PASSWORD"), args.starttls)
+    else:
+        transport = OutlookTransport()
+
+    def calculated_employees():
+        for employee_id, rows in RosterImport.read_employees(args.roster, args.employee_ids):
+            try:
+                employee, message = BatchCalculation.build_employee(employee_id, rows)
+                if employee is None:
+                    print(f"Skipped employee {employee_id}: {message}", file=sys.stderr)
+                    continue
+                # The memo only needs the bridge in service date and the PTO difference
+                Calculation.calculate_employee_totals(employee)
+            except Exception as e:
+                print(f"Skipped employee {employee_id}: Failed to calculate: {e}", file=sys.stderr)
+                continue
+            yield employee
+
+    with CalculationContext(as_of_date).activate():
+        sent, failed = BulkEmail.try_send_memos(BulkEmail.render_memos(calculated_employees()), transport)
+    print(f"Sent {sent} emails ({failed} failed).", file=sys.stderr)
+    return 0 if failed == 0 else 1
+
+
+# Stages timed while profiling is enabled, see Profiler in bridge_in_service_profiling
+Profiler.register(OutlookTransport, "send", "email_send")
+Profiler.register(SmtpTransport, "send", "email_send")
+Profiler.register(SpoolTransport, "send", "email_send")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from bridge_in_service_WIP_3 import ExcelExport
+
+
+class ExportWriter:
+    """
+    Writes exported files under an output root from a pool of writer threads.
+
+    Workbooks are rendered in memory by the caller and handed over as bytes, so rendering (CPU)
+    carries on while earlier files are still being written to a slow file share. At most
+    max_pending files wait to be written; submit blocks until one finishes, which keeps memory
+    bounded when the share cannot keep up. Files are written with ExcelExport.write_file, so each
+    lands atomically and transient I/O errors are retried.
+
+    Usage:
+        with ExportWriter(output_root) as writer:
+            for employee in employees:
+                writer.submit_employee(employee)
+    """
+
+    def __init__(self, output_root=ExcelExport.DEFAULT_DIRECTORY, workers=4, max_pending=16, retries=3, retry_delay=0.5):
+
+        self.output_root = output_root
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.executor = None
+        self.written = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+
+        os.makedirs(self.output_root, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        # Wait for the queued writes so every file is on the share (or reported failed) when this returns
+        self.executor.shutdown(wait=True)
+        self.executor = None
+
+    def write(self, file_name, data):
+
+        try:
+            ExcelExport.write_file(os.path.join(self.output_root, file_name), data, self.retries, self.retry_delay)
+        except Exception:
+            with self.lock:
+                self.failed += 1
+            raise
+        with self.lock:
+            self.written += 1
+
+    def submit(self, file_name, data):
+        """Queue data to be written to file_name under the output root and return the Future of the write."""
+        # Backpressure: wait while max_pending writes are already queued
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(self.write, file_name, data)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def submit_employee(self, employee):
+        """Render the workbook of a calculated employee (see Calculation.calculate_employee) and queue it for writing."""
+        data = ExcelExport.render_employee_workbook(employee, employee.original_monthly_accruals,
+                                                   employee.bridge_monthly_accruals, employee.accrual_differences)
+        return self.submit(ExcelExport.employee_file_name(employee), data)
+
+    @staticmethod
+    def try_export_employees(employees, output_root=ExcelExport.DEFAULT_DIRECTORY, workers=4):
+        """
+        Export a workbook for each calculated employee under output_root.
+
+        Returns:
+        tuple: (written, failed) counts.
+        """
+        written = failed = 0
+        try:
+            with ExportWriter(output_root, workers) as writer:
+                futures = []
+                for employee in employees:
+                    try:
+                        futures.append((employee.employee_id, writer.submit_employee(employee)))
+                    except Exception as e:
+                        print(f"Failed to export data to Excel for employee {employee.employee_id}: {e}", file=sys.stderr)
+                        failed += 1
+            for employee_id, future in futures:
+                if future.exception() is not None:
+                    print(f"Failed to export data to Excel for employee {employee_id}: {future.exception()}", file=sys.stderr)
+            written, failed = writer.written, failed + writer.failed
+        except Exception as e:
+            # The output root itself failed, count it so the export does not look successful
+            print(f"Failed to export data to Excel: {e}", file=sys.stderr)
+            failed += 1
+        return written, failed
@@ -0,0 +1,117 @@
+from bridge_in_service_WIP_3 import Calculation, CalculationContext, MonthlyAccruals
+from bridge_in_service_profiling import Profiler
+
+
+class AccrualTimeline:
+    """
+    Cached monthly accruals of one employee from one start date, with what they were calculated from.
+
+    running_totals[j] is the sum of hours[0..j] added left to right, exactly as the Calculation loops add them.
+    """
+
+    __slots__ = ("first_month", "service_month_offset", "initial_fte", "policy", "fte_timeline", "accruals", "running_totals")
+
+    def __init__(self, first_month, service_month_offset, initial_fte, policy):
+
+        self.first_month = first_month
+        self.service_month_offset = service_month_offset
+        self.initial_fte = initial_fte
+        self.policy = policy
+        self.fte_timeline = []
+        self.accruals = MonthlyAccruals()
+        self.running_totals = []
+
+    def truncate(self, month_count):
+
+        del self.accruals.months[month_count:]
+        del self.accruals.ftes[month_count:]
+        del self.accruals.hours[month_count:]
+        del self.running_totals[month_count:]
+
+
+class IncrementalCalculation:
+    """
+    Calculates monthly accruals like Calculation.calculate_pto_accrual_rate and
+    calculate_bridge_pto_accrual_rate, but keeps them per employee ID and only recalculates
+    the months a change can affect:
+
+    - a new day or month only adds (or drops) months at the end,
+    - a new or edited FTE change recalculates from the first month it applies to,
+    - an edited employment period or start date recalculates the timeline only if it moves
+      the service months used for the accrual rate tiers.
+
+    Use it anywhere Calculation's accrual functions are used, for example
+    Calculation.calculate_employee(employee, accrual_engine=IncrementalCalculation()).
+    """
+
+    def __init__(self):
+
+        self.timelines = {}  # (employee_id, bridge) -> AccrualTimeline
+        self.months_reused = 0
+        self.months_calculated = 0
+
+    def forget(self, employee_id):
+
+        self.timelines.pop((employee_id, False), None)
+        self.timelines.pop((employee_id, True), None)
+
+    @staticmethod
+    def first_changed_month(old_timeline, new_timeline):
+        """Return the first month whose FTE can differ between two FTE timelines, or None if they are equal."""
+        for old_change, new_change in zip(old_timeline, new_timeline):
+            if old_change != new_change:
+                return min(old_change[0], new_change[0])
+        if len(old_timeline) != len(new_timeline):
+            longer = old_timeline if len(old_timeline) > len(new_timeline) else new_timeline
+            return longer[min(len(old_timeline), len(new_timeline))][0]
+        return None
+
+    def update_timeline(self, employee, bridge):
+
+        first_month, month_count, offset = Calculation.calculate_accrual_window(employee, bridge)
+        fte_timeline = list(zip(employee.fte_timeline_months, employee.fte_timeline_ftes))
+        initial_fte = employee.fte_changes[0][1]
+        policy = CalculationContext.active_policy()
+
+        key = (employee.employee_id, bridge)
+        timeline = self.timelines.get(key)
+        if (timeline is None or timeline.first_month != first_month or timeline.service_month_offset != offset
+                or timeline.initial_fte != initial_fte or timeline.policy != policy):
+            timeline = AccrualTimeline(first_month, offset, initial_fte, policy)
+            self.timelines[key] = timeline
+
+        # Keep the months that are still in the window and come before the first changed FTE
+        valid_months = min(len(timeline.accruals), month_count)
+        changed_month = IncrementalCalculation.first_changed_month(timeline.fte_timeline, fte_timeline)
+        if changed_month is not None:
+            valid_months = min(valid_months, max(changed_month - first_month, 0))
+        timeline.truncate(valid_months)
+        timeline.fte_timeline = fte_timeline
+
+        total_pto_accrued = timeline.running_totals[-1] if timeline.running_totals else 0
+        for i in range(valid_months + 1, month_count + 1):
+            month = first_month + i - 1
+            current_fte = employee.get_fte_for_month(month)
+            pto_accrued_this_month = Calculation.get_accrual_rate_for_months_of_service(i + offset, current_fte, employee, policy)
+            timeline.accruals.add_month(month, current_fte, pto_accrued_this_month)
+            total_pto_accrued += pto_accrued_this_month
+            timeline.running_totals.append(total_pto_accrued)
+
+        self.months_reused += valid_months
+        self.months_calculated += month_count - valid_months
+
+        # Hand out a copy so later updates do not change results already given to the caller
+        accruals = timeline.accruals
+        return round(total_pto_accrued, 2), MonthlyAccruals(accruals.months[:], accruals.ftes[:], accruals.hours[:])
+
+    def calculate_pto_accrual_rate(self, employee):
+
+        return self.update_timeline(employee, bridge=False)
+
+    def calculate_bridge_pto_accrual_rate(self, employee):
+
+        return self.update_timeline(employee, bridge=True)
+
+
+# Timed as the accrual loop while profiling is enabled, see Profiler in bridge_in_service_profiling
+Profiler.register(IncrementalCalculation, "update_timeline", "accrual_loop")
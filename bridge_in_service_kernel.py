@@ -0,0 +1,126 @@
+import numpy as np
+from bridge_in_service_WIP_3 import Calculation, CalculationContext, MonthlyAccruals
+from bridge_in_service_profiling import Profiler
+
+
+class AccrualArrays:
+    """
+    Monthly accruals of one or more employees stored as flat NumPy arrays.
+
+    The months of employee k are the slice offsets[k]:offsets[k + 1] of every array.
+    months holds month ordinals (year * 12 + month - 1), tiers the accrual rate before FTE.
+    """
+
+    __slots__ = ("offsets", "months", "fte", "tiers", "hours")
+
+    def __init__(self, offsets, months, fte, tiers, hours):
+        self.offsets = offsets
+        self.months = months
+        self.fte = fte
+        self.tiers = tiers
+        self.hours = hours
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def employee_slice(self, index):
+        return slice(self.offsets[index], self.offsets[index + 1])
+
+    def total(self, index):
+        """Total hours of one employee, summed in month order exactly like the Calculation loops."""
+        hours = self.hours[self.employee_slice(index)]
+        if len(hours) == 0:
+            return 0
+        # cumsum adds strictly left to right, np.sum would use pairwise summation
+        return round(float(np.cumsum(hours)[-1]), 2)
+
+    def totals(self):
+        return [self.total(index) for index in range(len(self))]
+
+    def accrual_details(self, index):
+        """Monthly accruals of one employee as MonthlyAccruals."""
+        window = self.employee_slice(index)
+        return MonthlyAccruals(self.months[window].tolist(), self.fte[window].tolist(), self.hours[window].tolist())
+
+
+class AccrualKernel:
+    """
+    Array-backed replacement for the month by month loops of Calculation.calculate_pto_accrual_rate
+    and Calculation.calculate_bridge_pto_accrual_rate. Results are identical to the loops.
+    """
+
+    @staticmethod
+    def fte_change_months(employee):
+        """Return the employee's FTE timeline as arrays of first applicable month and new FTE."""
+        return np.array(employee.fte_timeline_months, dtype=np.int64), np.array(employee.fte_timeline_ftes, dtype=np.float64)
+
+    @staticmethod
+    def calculate_accruals(employees, bridge=False):
+        """
+        Calculate the monthly accruals of a batch of employees in one pass.
+
+        Parameters:
+        employees (list): Employees to calculate. For bridge accruals the bridge in service date must be set.
+        bridge (bool): Calculate from the bridge in service date instead of the most recent start date.
+
+        Returns:
+        AccrualArrays: The monthly accruals of every employee, in the order given.
+        """
+        if not employees:
+            empty = np.zeros(0, dtype=np.int64)
+            return AccrualArrays(np.zeros(1, dtype=np.int64), empty, np.zeros(0), np.zeros(0), np.zeros(0))
+
+        windows = [Calculation.calculate_accrual_window(employee, bridge) for employee in employees]
+        first_months = np.array([window[0] for window in windows], dtype=np.int64)
+        counts = np.array([window[1] for window in windows], dtype=np.int64)
+        service_offsets = np.array([window[2] for window in windows], dtype=np.int64)
+
+        offsets = np.zeros(len(employees) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        owner = np.repeat(np.arange(len(employees), dtype=np.int64), counts)
+        # Loop index i, starting at 1 for every employee
+        month_index = np.arange(offsets[-1], dtype=np.int64) - np.repeat(offsets[:-1], counts) + 1
+        months = first_months[owner] + month_index - 1
+
+        # FTE lookup for all employees at once: key every change and month by its owner so a single
+        # sorted search finds the last change that applies to each month.
+        change_months, change_ftes, initial_ftes = [], [], []
+        for employee in employees:
+            effective_months, new_ftes = AccrualKernel.fte_change_months(employee)
+            change_months.append(effective_months)
+            change_ftes.append(new_ftes)
+            initial_ftes.append(employee.fte_changes[0][1])
+        change_counts = np.array([len(effective_months) for effective_months in change_months], dtype=np.int64)
+        change_owner = np.repeat(np.arange(len(employees), dtype=np.int64), change_counts)
+        stride = np.int64(1) << 32
+        change_keys = change_owner * stride + np.concatenate(change_months)
+        change_ftes = np.concatenate(change_ftes)
+
+        position = np.searchsorted(change_keys, owner * stride + months, side="right") - 1
+        change_starts = np.concatenate(([0], np.cumsum(change_counts)))
+        # Months before the first change of their employee keep the initial FTE
+        applies = position >= change_starts[owner]
+        fte = np.where(applies, change_ftes[np.maximum(position, 0)], np.array(initial_ftes, dtype=np.float64)[owner])
+
+        adjusted_service_months = month_index + service_offsets[owner]
+        policy = CalculationContext.active_policy()
+        rates = np.array(policy.rates, dtype=np.float64)
+        tiers = rates[np.searchsorted(np.array(policy.thresholds), adjusted_service_months, side="left")]
+        hours = tiers * fte
+        return AccrualArrays(offsets, months, fte, tiers, hours)
+
+    @staticmethod
+    def calculate_pto_accrual_rate(employee):
+        """Drop-in replacement for Calculation.calculate_pto_accrual_rate."""
+        accruals = AccrualKernel.calculate_accruals([employee])
+        return accruals.total(0), accruals.accrual_details(0)
+
+    @staticmethod
+    def calculate_bridge_pto_accrual_rate(employee):
+        """Drop-in replacement for Calculation.calculate_bridge_pto_accrual_rate."""
+        accruals = AccrualKernel.calculate_accruals([employee], bridge=True)
+        return accruals.total(0), accruals.accrual_details(0)
+
+
+# Timed as the accrual loop while profiling is enabled, see Profiler in bridge_in_service_profiling
+Profiler.register(AccrualKernel, "calculate_accruals", "accrual_loop")
@@ -0,0 +1,35 @@
+import calendar
+from functools import lru_cache
+
+
+class MonthArithmetic:
+    """
+    Month arithmetic on month ordinals (year * 12 + month - 1), so consecutive months are
+    consecutive integers. The per-month tables are cached since a batch run only ever sees
+    a few hundred distinct months.
+    """
+
+    @staticmethod
+    def month_ordinal(date):
+
+        return date.year * 12 + date.month - 1
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def days_in_month(month_ordinal):
+
+        year, month_index = divmod(month_ordinal, 12)
+        return calendar.monthrange(year, month_index + 1)[1]
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def month_label(month_ordinal):
+        # Same text as datetime(year, month, 1).strftime("%B %Y")
+        year, month_index = divmod(month_ordinal, 12)
+        return f"{calendar.month_name[month_index + 1]} {year}"
+
+    @staticmethod
+    def next_sixteenth(date):
+        """Return the 16th of the date's month, or of the next month from the 16th on, keeping the time of day."""
+        year, month_index = divmod(MonthArithmetic.month_ordinal(date) + (date.day >= 16), 12)
+        return date.replace(year=year, month=month_index + 1, day=16)
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+
+class ProfileStats:
+    """
+    Call counts and timings per stage, and optionally every timed call as a trace event.
+
+    Stages nest: the accrual loop stage includes the FTE lookups made inside it. Times are
+    recorded in nanoseconds with time.perf_counter_ns.
+    """
+
+    def __init__(self, trace=False, max_trace_events=1000000):
+
+        self.stages = {}  # stage -> [count, total_ns, max_ns]
+        self.trace = trace
+        self.max_trace_events = max_trace_events
+        self.trace_events = []  # (stage, start_ns, duration_ns, pid, tid)
+        self.dropped_trace_events = 0
+
+    def record(self, stage, start_ns, end_ns):
+
+        duration_ns = end_ns - start_ns
+        stage_stats = self.stages.get(stage)
+        if stage_stats is None:
+            self.stages[stage] = [1, duration_ns, duration_ns]
+        else:
+            stage_stats[0] += 1
+            stage_stats[1] += duration_ns
+            if duration_ns > stage_stats[2]:
+                stage_stats[2] = duration_ns
+
+        if self.trace:
+            if len(self.trace_events) < self.max_trace_events:
+                self.trace_events.append((stage, start_ns, duration_ns, os.getpid(), threading.get_ident()))
+            else:
+                self.dropped_trace_events += 1
+
+    def merge(self, other):
+        """Add the counts, timings and trace events of another ProfileStats, for example from a worker process."""
+        for stage, (count, total_ns, max_ns) in other.stages.items():
+            stage_stats = self.stages.setdefault(stage, [0, 0, 0])
+            stage_stats[0] += count
+            stage_stats[1] += total_ns
+            stage_stats[2] = max(stage_stats[2], max_ns)
+
+        if self.trace:
+            room = max(self.max_trace_events - len(self.trace_events), 0)
+            self.trace_events.extend(other.trace_events[:room])
+            self.dropped_trace_events += other.dropped_trace_events + max(len(other.trace_events) - room, 0)
+
+    def summary(self):
+        """Return {stage: {"count", "total_seconds", "mean_seconds", "max_seconds"}} ordered by total time."""
+        return {
+            stage: {
+                "count": count,
+                "total_seconds": total_ns / 1e9,
+                "mean_seconds": total_ns / count / 1e9,
+                "max_seconds": max_ns / 1e9
+            }
+            for stage, (count, total_ns, max_ns) in sorted(self.stages.items(), key=lambda item: -item[1][1])
+        }
+
+    def report(self):
+        """Return the summary as a text table."""
+        lines = [f"{'Stage':<20} {'Calls':>10} {'Total (s)':>12} {'Mean (us)':>12} {'Max (ms)':>10}"]
+        for stage, stage_stats in self.summary().items():
+            lines.append(f"{stage:<20} {stage_stats['count']:>10} {stage_stats['total_seconds']:>12.4f} "
+                         f"{stage_stats['mean_seconds'] * 1e6:>12.1f} {stage_stats['max_seconds'] * 1e3:>10.2f}")
+        if self.dropped_trace_events:
+            lines.append(f"{self.dropped_trace_events} trace events were dropped after the first {self.max_trace_events}.")
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """Return the trace events in the Chrome trace event format, for chrome://tracing or Perfetto."""
+        return {
+            "traceEvents": [
+                {"name": stage, "cat": "bridge_in_service", "ph": "X", "ts": start_ns / 1000, "dur": duration_ns / 1000, "pid": pid, "tid": tid}
+                for stage, start_ns, duration_ns, pid, tid in self.trace_events
+            ],
+            "displayTimeUnit": "ms",
+            "otherData": {"stages": self.summary(), "dropped_trace_events": self.dropped_trace_events}
+        }
+
+    def try_write_chrome_trace(self, file_path):
+
+        try:
+            with open(file_path, "w", encoding="utf-8") as trace_file:
+                json.dump(self.chrome_trace(), trace_file)
+            return True
+        except Exception as e:
+            print(f"Failed to write trace: {e}")
+            return False
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of the calculation, export and email stages.
+
+    Modules register the functions that make up a stage with Profiler.register. The functions are
+    only replaced by timed wrappers while profiling is enabled and restored when it is disabled,
+    so with profiling off they are called directly and cost nothing extra.
+
+    Usage:
+        with Profiler.profiling(trace=True) as stats:
+            Calculation.calculate_employee(employee)
+        print(stats.report())
+        stats.try_write_chrome_trace("trace.json")
+    """
+
+    targets = []  # (owner, attribute, stage)
+    originals = {}  # (owner, attribute) -> the attribute as defined on the class
+    stats = None
+
+    @staticmethod
+    def register(owner, attribute, stage):
+        """Time every call of owner.attribute (a function or staticmethod defined on the class) as stage."""
+        Profiler.targets.append((owner, attribute, stage))
+        if Profiler.stats is not None:
+            Profiler.wrap(owner, attribute, stage)
+
+    @staticmethod
+    def wrap(owner, attribute, stage):
+
+        original = owner.__dict__[attribute]
+        is_static = isinstance(original, staticmethod)
+        function = original.__func__ if is_static else original
+        record = Profiler.stats.record
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            start_ns = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(stage, start_ns, time.perf_counter_ns())
+
+        Profiler.originals[(owner, attribute)] = original
+        setattr(owner, attribute, staticmethod(timed) if is_static else timed)
+
+    @staticmethod
+    def is_enabled():
+
+        return Profiler.stats is not None
+
+    @staticmethod
+    def enable(trace=False, stats=None):
+        """Start timing the registered stages and return the ProfileStats they are recorded in."""
+        if Profiler.stats is not None:
+            return Profiler.stats
+        Profiler.stats = stats or ProfileStats(trace)
+        for owner, attribute, stage in Profiler.targets:
+            Profiler.wrap(owner, attribute, stage)
+        return Profiler.stats
+
+    @staticmethod
+    def disable():
+        """Stop timing, restore the original functions and return the recorded ProfileStats."""
+        for (owner, attribute), original in Profiler.originals.items():
+            setattr(owner, attribute, original)
+        Profiler.originals.clear()
+        stats, Profiler.stats = Profiler.stats, None
+        return stats
+
+    @staticmethod
+    @contextmanager
+    def profiling(trace=False):
+
+        # Nested inside an enabled profiler, record into its stats and leave it enabled
+        was_enabled = Profiler.is_enabled()
+        stats = Profiler.enable(trace)
+        try:
+            yield stats
+        finally:
+            if not was_enabled:
+                Profiler.disable()
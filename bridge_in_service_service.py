@@ -0,0 +1,315 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from aiohttp import web
+from bridge_in_service_WIP_3 import Calculation, CalculationContext, DateOperations
+from bridge_in_service_batch import BatchCalculation, RosterImport
+from bridge_in_service_cache import ResultCache
+from bridge_in_service_months import MonthArithmetic
+from bridge_in_service_profiling import ProfileStats
+
+
+class ServiceWorker:
+    """
+    The calculations the service runs in its worker processes. Each worker keeps its ResultCache
+    for as long as the service runs, and both single employees and batch chunks calculate through
+    it, so repeated requests for an employee reuse the accruals.
+    """
+
+    cache = None
+
+    @staticmethod
+    def initialize(cache_dir=None):
+
+        ServiceWorker.cache = ResultCache(cache_dir=cache_dir)
+
+    @staticmethod
+    def monthly_accruals(employee):
+        """Return the employee's monthly accruals as JSON-serializable rows, in month order."""
+        original, bridge = employee.original_monthly_accruals, employee.bridge_monthly_accruals
+        rows = []
+        for month, _, difference in employee.accrual_differences:
+            original_index, bridge_index = original.index_of(month), bridge.index_of(month)
+            rows.append({
+                "Month": MonthArithmetic.month_label(month),
+                "Original Hours": round(original.hours[original_index], 2) if original_index is not None else 0.0,
+                "Original FTE": original.ftes[original_index] if original_index is not None else None,
+                "Bridge Hours": round(bridge.hours[bridge_index], 2) if bridge_index is not None else 0.0,
+                "Bridge FTE": bridge.ftes[bridge_index] if bridge_index is not None else None,
+                "Difference Hours": difference
+            })
+        return rows
+
+    @staticmethod
+    def calculate_employee(employee_id, rows, as_of_date):
+        """Calculate one employee with its monthly accruals and return the batch result row with a "Monthly Accruals" list."""
+        with CalculationContext(as_of_date, accrual_cache=ServiceWorker.cache).activate():
+            try:
+                employee, message = BatchCalculation.build_employee(employee_id, rows)
+                if employee is None:
+                    return BatchCalculation.employee_result(employee_id, rows, message)
+                totals = Calculation.calculate_employee(employee)
+            except Exception as e:
+                return BatchCalculation.employee_result(employee_id, rows, f"Failed to calculate: {e}")
+            result = BatchCalculation.calculated_result(employee_id, rows, employee, totals)
+            result["Monthly Accruals"] = ServiceWorker.monthly_accruals(employee)
+            return result
+
+    @staticmethod
+    def calculate_chunk(chunk, as_of_date):
+        """
+        Calculate a list of (employee_id, rows) with the worker's ResultCache.
+
+        Returns (results, None), the (results, profile_stats) of BatchCalculation.calculate_chunk,
+        so BatchCalculation.chunk_results reads it.
+        """
+        with CalculationContext(as_of_date, accrual_cache=ServiceWorker.cache).activate():
+            return [BatchCalculation.calculate_employee_result(employee_id, rows, ServiceWorker.cache) for employee_id, rows in chunk], None
+
+
+class CalculationService:
+    """
+    Local HTTP service for the bridge in service calculation, so several users and the HRIS
+    integration share one set of warm worker processes instead of each starting the program.
+
+    Routes:
+        POST /employee  One employee as JSON, returns its result with the monthly accruals.
+        POST /batch     Employees as JSON lines, streams a JSON line per employee as results finish.
+        GET  /metrics   Request counts and timings per route, and worker and employee counts.
+
+    Both calculation routes take an optional as_of=MM/DD/YYYY query parameter. Requests are
+    handled on the event loop and the calculations run in a pool of worker processes, so a
+    long batch does not hold up other requests.
+
+    Each worker process has its own ResultCache. Without cache_dir these are separate in-memory
+    caches, so a repeated request hits only when it lands on a worker that calculated it before.
+    With cache_dir the workers also share entries through the directory.
+
+    An employee is a JSON object:
+        {"employee_id": "01234567", "first_name": "Ada", "last_name": "Lovelace",
+         "most_recent_start_date": "01/15/2010", "fte": 0.9,
+         "employment_periods": [["03/01/2001", "04/30/2005"]], "fte_changes": [["07/01/2015", 1.0]]}
+    """
+
+    def __init__(self, workers=None, chunk_size=50, cache_dir=None):
+
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.cache_dir = cache_dir
+        self.executor = None
+        self.metrics = ProfileStats()
+        self.status_counts = {}
+        self.employees_calculated = 0
+        self.pool_restarts = 0
+        self.started = time.time()
+
+    def application(self):
+
+        app = web.Application(middlewares=[self.timing])
+        app.router.add_post("/employee", self.calculate_employee)
+        app.router.add_post("/batch", self.calculate_batch)
+        app.router.add_get("/metrics", self.get_metrics)
+        app.on_startup.append(self.start_workers)
+        app.on_cleanup.append(self.stop_workers)
+        return app
+
+    def new_executor(self):
+
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=ServiceWorker.initialize, initargs=(self.cache_dir,))
+
+    async def start_workers(self, app):
+
+        self.executor = self.new_executor()
+
+    async def stop_workers(self, app):
+
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.executor = None
+
+    def restart_workers(self, broken_executor):
+        """Replace the pool after a worker process died, unless another request already replaced it."""
+        if self.executor is not broken_executor:
+            return
+        broken_executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.new_executor()
+        self.pool_restarts += 1
+        print(f"A worker process died, restarted the worker pool ({self.pool_restarts} restarts).", file=sys.stderr)
+
+    async def run_in_workers(self, function, *args):
+        """
+        Run function(*args) in the worker pool. If a worker process died (the pool is broken), start
+        a new pool and retry once, so only a request that kills its worker again fails.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self.executor
+            try:
+                return await loop.run_in_executor(executor, function, *args)
+            except BrokenProcessPool:
+                self.restart_workers(executor)
+                if attempt:
+                    raise
+
+    @web.middleware
+    async def timing(self, request, handler):
+
+        resource = request.match_info.route.resource
+        route = f"{request.method} {resource.canonical if resource is not None else 'unmatched'}"
+        start_ns = time.perf_counter_ns()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            # Streamed batches are timed until the last result is written
+            self.metrics.record(route, start_ns, time.perf_counter_ns())
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    @staticmethod
+    def json_error(status, message):
+
+        return web.json_response({"error": message}, status=status)
+
+    @staticmethod
+    def as_of_date(request):
+        """Return the as_of query parameter as a datetime, today at midnight if it is not given, or None if it is invalid."""
+        as_of = request.query.get("as_of")
+        if not as_of:
+            # Midnight rather than now, so requests during the day share the same cached accruals
+            return DateOperations.get_todays_date().replace(hour=0, minute=0, second=0, microsecond=0)
+        return DateOperations.convert_to_datetime(as_of)
+
+    @staticmethod
+    def employee_rows(payload):
+        """
+        Convert an employee JSON object to (employee_id, rows) in the roster format, so requests go
+        through the same checks as roster rows in BatchCalculation.build_employee.
+        """
+        if not isinstance(payload, dict):
+            raise ValueError("Expected a JSON object.")
+        employee_id = RosterImport.cell_to_text(payload.get("employee_id"))
+        periods = payload.get("employment_periods") or []
+        changes = payload.get("fte_changes") or []
+        rows = []
+        for i in range(max(1, len(periods), len(changes))):
+            row = {"Employee ID": employee_id}
+            if i == 0:
+                row["First Name"] = payload.get("first_name")
+                row["Last Name"] = payload.get("last_name")
+                row["Most Recent Start Date"] = payload.get("most_recent_start_date")
+                row["FTE"] = payload.get("fte")
+            if i < len(periods):
+                row["Period Start"], row["Period End"] = periods[i]
+            if i < len(changes):
+                row["FTE Change Date"], row["New FTE"] = changes[i]
+            rows.append(row)
+        return employee_id, rows
+
+    async def calculate_employee(self, request):
+
+        as_of_date = CalculationService.as_of_date(request)
+        if as_of_date is None:
+            return CalculationService.json_error(400, "Invalid as_of date. Please use MM/DD/YYYY.")
+        try:
+            employee_id, rows = CalculationService.employee_rows(await request.json())
+        except (ValueError, TypeError) as e:
+            return CalculationService.json_error(400, f"Invalid employee: {e}")
+
+        try:
+            result = await self.run_in_workers(ServiceWorker.calculate_employee, employee_id, rows, as_of_date)
+        except Exception as e:
+            return CalculationService.json_error(500, f"Failed to calculate: {e}")
+        self.employees_calculated += 1
+        return web.json_response(result)
+
+    async def calculate_batch(self, request):
+
+        as_of_date = CalculationService.as_of_date(request)
+        if as_of_date is None:
+            return CalculationService.json_error(400, "Invalid as_of date. Please use MM/DD/YYYY.")
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        # Only a few chunks per worker are in flight, so a long upload is read as fast as it is calculated
+        max_pending = self.workers * 2
+        pending = {}  # future -> [(line, employee_id, rows)]
+
+        def submit(chunk):
+            future = asyncio.ensure_future(self.run_in_workers(ServiceWorker.calculate_chunk,
+                                                               [(employee_id, rows) for _, employee_id, rows in chunk], as_of_date))
+            pending[future] = chunk
+
+        async def write_finished(return_when):
+            done, _ = await asyncio.wait(pending, return_when=return_when)
+            for future in done:
+                chunk = pending.pop(future)
+                results = BatchCalculation.chunk_results([(employee_id, rows) for _, employee_id, rows in chunk], future)
+                for (line, _, _), result in zip(chunk, results):
+                    result["Line"] = line
+                    await response.write(json.dumps(result).encode("utf-8") + b"\n")
+                self.employees_calculated += len(chunk)
+
+        chunk = []
+        line = 0
+        async for text in request.content:
+            if not text.strip():
+                continue
+            line += 1
+            try:
+                employee_id, rows = CalculationService.employee_rows(json.loads(text))
+            except (ValueError, TypeError) as e:
+                await response.write(json.dumps({"Line": line, "Status": f"Invalid employee: {e}"}).encode("utf-8") + b"\n")
+                continue
+            chunk.append((line, employee_id, rows))
+            if len(chunk) == self.chunk_size:
+                submit(chunk)
+                chunk = []
+                if len(pending) >= max_pending:
+                    await write_finished(asyncio.FIRST_COMPLETED)
+        if chunk:
+            submit(chunk)
+        while pending:
+            await write_finished(asyncio.FIRST_COMPLETED)
+
+        await response.write_eof()
+        return response
+
+    async def get_metrics(self, request):
+
+        return web.json_response({
+            "uptime_seconds": time.time() - self.started,
+            "workers": self.workers,
+            "employees_calculated": self.employees_calculated,
+            "worker_pool_restarts": self.pool_restarts,
+            "responses_by_status": {str(status): count for status, count in sorted(self.status_counts.items())},
+            "requests": self.metrics.summary()
+        })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the bridge in service calculation over HTTP on this machine.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1, this machine only)")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    parser.add_argument("--workers", type=int, default=0, help="Number of worker processes, 0 for one per CPU (default: 0)")
+    parser.add_argument("--chunk-size", type=int, default=50, help="Batch employees sent to a worker at a time (default: 50)")
+    parser.add_argument("--cache-dir", help="Directory the workers cache accruals in, shared with batch runs")
+    args = parser.parse_args(argv)
+    if args.workers < 0 or args.chunk_size < 1:
+        parser.error("--workers must be 0 or more and --chunk-size at least 1.")
+
+    service = CalculationService(args.workers, args.chunk_size, args.cache_dir)
+    web.run_app(service.application(), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+from datetime import datetime
+from bridge_in_service_WIP_3 import Employee
+
+
+class EmployeeStore:
+    """
+    SQLite store for employees, their prior employment periods and FTE changes.
+
+    The current employment period (most recent start date to today) and the initial FTE are
+    not stored as rows, Employee derives them when it is loaded. Dates are stored in ISO format
+    so they sort and index correctly.
+    """
+
+    # Where the GUI saves and loads employees, set BRIDGE_IN_SERVICE_STORE to use another file
+    DEFAULT_PATH = os.environ.get("BRIDGE_IN_SERVICE_STORE", os.path.join(os.path.expanduser("~"), "BridgeInService.sqlite3"))
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS employees (
+            employee_id TEXT PRIMARY KEY,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            most_recent_start_date TEXT NOT NULL,
+            initial_fte REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS employment_periods (
+            id INTEGER PRIMARY KEY,
+            employee_id TEXT NOT NULL REFERENCES employees (employee_id) ON DELETE CASCADE,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS employment_periods_employee ON employment_periods (employee_id, start_date);
+        CREATE TABLE IF NOT EXISTS fte_changes (
+            id INTEGER PRIMARY KEY,
+            employee_id TEXT NOT NULL REFERENCES employees (employee_id) ON DELETE CASCADE,
+            change_date TEXT NOT NULL,
+            fte REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS fte_changes_employee ON fte_changes (employee_id, change_date);
+    """
+
+    def __init__(self, db_path=DEFAULT_PATH):
+
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(EmployeeStore.SCHEMA)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    def close(self):
+
+        self.connection.close()
+
+    def save_employee(self, employee):
+        """Insert or replace an employee with all of their prior employment periods and FTE changes."""
+        with self.connection:
+            self.connection.execute("DELETE FROM employees WHERE employee_id = ?", (employee.employee_id,))
+            self.connection.execute(
+                "INSERT INTO employees VALUES (?, ?, ?, ?, ?)",
+                (employee.employee_id, employee.first_name, employee.last_name,
+                 employee.most_recent_start_date.isoformat(), employee.fte_changes[0][1])
+            )
+            # The first period and FTE change are the ones Employee creates from the most recent start date
+            self.connection.executemany(
+                "INSERT INTO employment_periods (employee_id, start_date, end_date) VALUES (?, ?, ?)",
+                [(employee.employee_id, start.isoformat(), end.isoformat()) for start, end in employee.prior_employment_periods[1:]]
+            )
+            self.connection.executemany(
+                "INSERT INTO fte_changes (employee_id, change_date, fte) VALUES (?, ?, ?)",
+                [(employee.employee_id, change_date.isoformat(), fte) for change_date, fte in employee.fte_changes[1:]]
+            )
+
+    def delete_employee(self, employee_id):
+
+        with self.connection:
+            self.connection.execute("DELETE FROM employees WHERE employee_id = ?", (employee_id,))
+
+    def employee_ids(self):
+
+        return [row[0] for row in self.connection.execute("SELECT employee_id FROM employees ORDER BY employee_id")]
+
+    def load_employee(self, employee_id):
+        """Return the stored employee, or None if there is no employee with this ID."""
+        return next(self.load_employees([employee_id]), None)
+
+    def load_employees(self, employee_ids=None):
+        """
+        Yield stored employees ordered by employee ID, optionally only the given IDs.
+
+        The employees, periods and FTE changes are read with one ordered query each and merged,
+        so a whole roster is streamed without a query per employee.
+        """
+        where, params = "", ()
+        if employee_ids is not None:
+            employee_ids = list(employee_ids)
+            where = f"WHERE employee_id IN ({', '.join('?' * len(employee_ids))})"
+            params = tuple(employee_ids)
+
+        employees = self.connection.execute(
+            f"SELECT employee_id, first_name, last_name, most_recent_start_date, initial_fte FROM employees {where} ORDER BY employee_id", params)
+        periods = self.connection.execute(
+            f"SELECT employee_id, start_date, end_date FROM employment_periods {where} ORDER BY employee_id, id", params)
+        changes = self.connection.execute(
+            f"SELECT employee_id, change_date, fte FROM fte_changes {where} ORDER BY employee_id, id", params)
+        period = next(periods, None)
+        change = next(changes, None)
+
+        for employee_id, first_name, last_name, most_recent_start_date, initial_fte in employees:
+            employee = Employee(employee_id, first_name, last_name, datetime.fromisoformat(most_recent_start_date), initial_fte)
+            while period is not None and period[0] == employee_id:
+                employee.add_employment_period(datetime.fromisoformat(period[1]), datetime.fromisoformat(period[2]))
+                period = next(periods, None)
+            while change is not None and change[0] == employee_id:
+                employee.add_fte_change(datetime.fromisoformat(change[1]), change[2])
+                change = next(changes, None)
+            yield employee
@@ -0,0 +1,279 @@
+import argparse
+import csv
+import sys
+from datetime import datetime
+from decimal import Decimal
+import numpy as np
+from bridge_in_service_WIP_3 import CalculationContext, DateOperations, EmploymentPeriodIndex
+from bridge_in_service_compact import CompactDates
+from bridge_in_service_months import MonthArithmetic
+from bridge_in_service_profiling import Profiler
+
+
+class SweepResult:
+    """
+    Totals of one employee for a series of as-of dates, stored as NumPy arrays in the order of the dates.
+
+    Dates are int64 microseconds since 1970-01-01 (see CompactDates), totals are whole cents.
+    """
+
+    __slots__ = ("as_of_dates", "bridge_in_service_dates", "original_cents", "bridge_cents")
+
+    def __init__(self, as_of_dates, bridge_in_service_dates, original_cents, bridge_cents):
+        self.as_of_dates = as_of_dates
+        self.bridge_in_service_dates = bridge_in_service_dates
+        self.original_cents = original_cents
+        self.bridge_cents = bridge_cents
+
+    def __len__(self):
+        return len(self.as_of_dates)
+
+    def difference_cents(self):
+        return self.bridge_cents - self.original_cents
+
+    def totals(self, index):
+        """Return (bridge_in_service_date, total_original, total_bridge, total_difference) like Calculation.calculate_employee_totals."""
+        total_original = Decimal(int(self.original_cents[index])).scaleb(-2)
+        total_bridge = Decimal(int(self.bridge_cents[index])).scaleb(-2)
+        total_difference = (total_bridge - total_original).quantize(Decimal('0.00'))
+        return CompactDates.from_int(int(self.bridge_in_service_dates[index])), total_original, total_bridge, total_difference
+
+
+class AsOfSweep:
+    """
+    The totals of Calculation.calculate_employee_totals for many as-of dates in one vectorized pass.
+
+    Every as-of date accrues over the same calendar months from the month after the most recent
+    start date; only how many of them count, and the service months of the first one, change with
+    the date. So the FTE and the hours of each month at each accrual tier are worked out once, as
+    running sums of cents, and each date's total is a few lookups in them. The accrual windows and
+    bridge in service dates of all dates are computed together with array arithmetic that follows
+    Calculation.calculate_accrual_window.
+
+    Each as-of date gives the result of entering the employee on that date and calculating with
+    DateOperations pinned to it: the current employment period runs from the most recent start
+    date to the as-of date.
+    """
+
+    MICROSECONDS_PER_DAY = 86400 * 1000000
+    EPOCH_MONTH = 1970 * 12
+
+    @staticmethod
+    def month_start(month_ordinals):
+        """Microseconds at the start of each month ordinal."""
+        days = (month_ordinals - AsOfSweep.EPOCH_MONTH).astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+        return days * AsOfSweep.MICROSECONDS_PER_DAY
+
+    @staticmethod
+    def date_parts(dates):
+        """Split microsecond dates into (month ordinal, day of the month, days in the month)."""
+        days = dates // AsOfSweep.MICROSECONDS_PER_DAY
+        month_ordinals = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) + AsOfSweep.EPOCH_MONTH
+        month_days = AsOfSweep.month_start(month_ordinals) // AsOfSweep.MICROSECONDS_PER_DAY
+        days_in_month = AsOfSweep.month_start(month_ordinals + 1) // AsOfSweep.MICROSECONDS_PER_DAY - month_days
+        return month_ordinals, days - month_days + 1, days_in_month
+
+    @staticmethod
+    def next_sixteenth(dates):
+        """Vectorized MonthArithmetic.next_sixteenth, returns (month ordinal, microseconds) of the 16th."""
+        month_ordinals, day, _ = AsOfSweep.date_parts(dates)
+        time_of_day = dates % AsOfSweep.MICROSECONDS_PER_DAY
+        sixteenth_months = month_ordinals + (day >= 16)
+        return sixteenth_months, AsOfSweep.month_start(sixteenth_months) + 15 * AsOfSweep.MICROSECONDS_PER_DAY + time_of_day
+
+    @staticmethod
+    def bridge_in_service_dates(employee, as_of_dates):
+        """
+        Calculation.calculate_bridge_in_service_date for each as-of date: the as-of date less the time
+        covered by the prior periods together with the current period up to the as-of date.
+        """
+        prior = EmploymentPeriodIndex(employee.prior_employment_periods[1:])
+        starts = np.array([CompactDates.to_int(start_date) for start_date in prior.starts], dtype=np.int64)
+        ends = np.array([CompactDates.to_int(end_date) for end_date in prior.ends], dtype=np.int64)
+        most_recent_start = CompactDates.to_int(employee.most_recent_start_date)
+
+        # The current period only counts the time no prior period already covers, and none if it ends before it starts
+        overlap = np.clip(np.minimum(ends[:, None], as_of_dates[None, :]) - np.maximum(starts, most_recent_start)[:, None], 0, None).sum(axis=0)
+        current = np.where(as_of_dates >= most_recent_start, as_of_dates - most_recent_start - overlap, 0)
+        return as_of_dates - (int((ends - starts).sum()) + current)
+
+    @staticmethod
+    def accrual_windows(employee, as_of_dates, bridge_dates):
+        """
+        calculate_accrual_window of both timelines for each as-of date.
+
+        Returns:
+        tuple: (month_count, original_offset, bridge_offset) arrays, the first month is the same for every date.
+        """
+        today_month, today_day, today_days_in_month = AsOfSweep.date_parts(as_of_dates)
+        start_date = employee.most_recent_start_date
+        start_month = MonthArithmetic.month_ordinal(start_date)
+        start_sixteenth_month, start_sixteenth = AsOfSweep.next_sixteenth(np.array([CompactDates.to_int(start_date)], dtype=np.int64))
+        bridge_month, bridge_day, _ = AsOfSweep.date_parts(bridge_dates)
+        bridge_sixteenth_month, bridge_sixteenth = AsOfSweep.next_sixteenth(bridge_dates)
+        before_16 = today_day < 16
+
+        # calculate_service_months_from_recent_start and its _pre_16 version
+        months_since_recent_start = np.where(
+            before_16,
+            np.where(as_of_dates > start_sixteenth, today_month - start_sixteenth_month, 0) + 1 - (start_date.day < 16),
+            today_month - start_month + (today_days_in_month >= start_date.day)
+        )
+        # calculate_service_months_from_bridge and its _pre_16 version, less the adjustments of
+        # calculate_adjusted_service_months_for_bridge (none) and _post_16
+        bridge_service_months = np.where(
+            before_16,
+            np.where(as_of_dates > bridge_sixteenth, today_month - bridge_sixteenth_month, 0),
+            today_month - bridge_month + (today_days_in_month >= bridge_day) - (bridge_day > 15)
+        )
+        original_offset = -int(start_date.day >= 16)
+        return np.maximum(months_since_recent_start - 1, 0), original_offset, bridge_service_months - months_since_recent_start
+
+    @staticmethod
+    def tier_cents(employee, first_month, month_count, policy):
+        """
+        Running sums of the cents of loop months 1 to month_count at each accrual rate of the policy.
+
+        Returns:
+        ndarray: (len(policy.rates), month_count + 1) array, entry [tier, i] is the sum over months 1 to i.
+        """
+        months = first_month + np.arange(month_count, dtype=np.int64)
+        timeline_months = np.array(employee.fte_timeline_months, dtype=np.int64)
+        position = np.searchsorted(timeline_months, months, side="right") - 1
+        ftes = [employee.fte_changes[0][1]] + employee.fte_timeline_ftes
+        # Months before the first change keep the initial FTE
+        fte_index = position + 1
+
+        running = np.zeros((len(policy.rates), month_count + 1), dtype=np.int64)
+        for tier, rate in enumerate(policy.rates):
+            # Rounded in Python like MonthlyAccruals.cents, once per distinct FTE
+            cents = np.array([round(round(rate * fte, 2) * 100) for fte in ftes], dtype=np.int64)
+            np.cumsum(cents[fte_index], out=running[tier, 1:])
+        return running
+
+    @staticmethod
+    def window_cents(running, month_count, offset, policy):
+        """Total cents of loop months 1 to month_count whose adjusted service months are i + offset."""
+        total = np.zeros(len(month_count), dtype=np.int64)
+        # Tier k covers the adjusted service months after thresholds[k - 1] up to thresholds[k]
+        bounds = [None, *policy.thresholds, None]
+        for tier in range(len(policy.rates)):
+            low = 0 if bounds[tier] is None else np.clip(bounds[tier] - offset, 0, month_count)
+            high = month_count if bounds[tier + 1] is None else np.clip(bounds[tier + 1] - offset, 0, month_count)
+            total += np.where(high > low, running[tier, high] - running[tier, low], 0)
+        return total
+
+    @staticmethod
+    def sweep(employee, as_of_dates):
+        """
+        Calculate an employee's totals for every as-of date.
+
+        Parameters:
+        employee (Employee): The employee with all employment periods and FTE changes added.
+        as_of_dates (list): The as-of dates (datetimes), in any order.
+
+        Returns:
+        SweepResult: The bridge in service date and totals for each as-of date.
+        """
+        as_of_dates = np.array([CompactDates.to_int(as_of_date) for as_of_date in as_of_dates], dtype=np.int64)
+        bridge_dates = AsOfSweep.bridge_in_service_dates(employee, as_of_dates)
+        month_count, original_offset, bridge_offset = AsOfSweep.accrual_windows(employee, as_of_dates, bridge_dates)
+
+        first_month = MonthArithmetic.month_ordinal(employee.most_recent_start_date) + 1
+        policy = CalculationContext.active_policy()
+        running = AsOfSweep.tier_cents(employee, first_month, int(month_count.max(initial=0)), policy)
+        original_cents = AsOfSweep.window_cents(running, month_count, original_offset, policy)
+        bridge_cents = AsOfSweep.window_cents(running, month_count, bridge_offset, policy)
+        return SweepResult(as_of_dates, bridge_dates, original_cents, bridge_cents)
+
+    @staticmethod
+    def liability_curve(employees, as_of_dates):
+        """
+        Sum the totals of many employees for every as-of date.
+
+        Returns:
+        tuple: (employee_count, original_cents, bridge_cents), the totals as int64 arrays of cents.
+        """
+        original_cents = np.zeros(len(as_of_dates), dtype=np.int64)
+        bridge_cents = np.zeros(len(as_of_dates), dtype=np.int64)
+        employee_count = 0
+        for employee in employees:
+            result = AsOfSweep.sweep(employee, as_of_dates)
+            original_cents += result.original_cents
+            bridge_cents += result.bridge_cents
+            employee_count += 1
+        return employee_count, original_cents, bridge_cents
+
+    @staticmethod
+    def month_end_dates(first_date, last_date):
+        """Return the last day of every month from first_date's month to last_date's month."""
+        month_ends = []
+        for month in range(MonthArithmetic.month_ordinal(first_date), MonthArithmetic.month_ordinal(last_date) + 1):
+            year, month_index = divmod(month, 12)
+            month_ends.append(datetime(year, month_index + 1, MonthArithmetic.days_in_month(month)))
+        return month_ends
+
+
+def main(argv=None):
+    # Imported here so the sweep itself does not depend on the roster import
+    from bridge_in_service_batch import BatchCalculation, RosterImport
+
+    parser = argparse.ArgumentParser(description="Calculate the PTO totals of a roster at every month end in a date range.")
+    parser.add_argument("roster", help="CSV or XLSX roster with the columns: " + ", ".join(RosterImport.COLUMNS) + ", or an employee store (.sqlite3)")
+    parser.add_argument("output", help="CSV file to write the totals to, or - for standard output")
+    parser.add_argument("--from", dest="first_date", required=True, help="First month end (MM/DD/YYYY, any day of the month)")
+    parser.add_argument("--to", dest="last_date", required=True, help="Last month end (MM/DD/YYYY, any day of the month)")
+    parser.add_argument("--by-employee", action="store_true", help="Write a row per employee and month end instead of roster totals")
+    parser.add_argument("--employee", action="append", dest="employee_ids", metavar="ID", help="Only include this employee, can be repeated")
+    args = parser.parse_args(argv)
+
+    first_date = DateOperations.convert_to_datetime(args.first_date)
+    last_date = DateOperations.convert_to_datetime(args.last_date)
+    if first_date is None or last_date is None:
+        parser.error("Invalid --from or --to date. Please use MM/DD/YYYY.")
+    if last_date < first_date:
+        parser.error("--to must not be before --from.")
+    as_of_dates = AsOfSweep.month_end_dates(first_date, last_date)
+
+    def built_employees():
+        for employee_id, rows in RosterImport.read_employees(args.roster, args.employee_ids):
+            employee, message = BatchCalculation.build_employee(employee_id, rows)
+            if employee is None:
+                print(f"Skipped employee {employee_id}: {message}", file=sys.stderr)
+                continue
+            yield employee
+
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    # Validate the roster as of the last month end, so every employee of the curve is included
+    context = CalculationContext(as_of_dates[-1])
+    try:
+        writer = csv.writer(output_file)
+        if args.by_employee:
+            writer.writerow(["Employee ID", "As Of Date", "Bridge In Service Date", "Original PTO", "Bridge PTO", "PTO Accrual Difference"])
+            for employee in context.iterate(built_employees()):
+                result = AsOfSweep.sweep(employee, as_of_dates)
+                for index, as_of_date in enumerate(as_of_dates):
+                    bridge_in_service_date, total_original, total_bridge, total_difference = result.totals(index)
+                    writer.writerow([employee.employee_id, as_of_date.strftime("%m/%d/%Y"), bridge_in_service_date.strftime("%m/%d/%Y"),
+                                     f"{total_original:.2f}", f"{total_bridge:.2f}", f"{total_difference:.2f}"])
+        else:
+            employee_count, original_cents, bridge_cents = AsOfSweep.liability_curve(context.iterate(built_employees()), as_of_dates)
+            writer.writerow(["As Of Date", "Employees", "Original PTO", "Bridge PTO", "PTO Accrual Difference"])
+            for as_of_date, original, bridge in zip(as_of_dates, original_cents.tolist(), bridge_cents.tolist()):
+                writer.writerow([as_of_date.strftime("%m/%d/%Y"), employee_count, f"{Decimal(original).scaleb(-2):.2f}",
+                                 f"{Decimal(bridge).scaleb(-2):.2f}", f"{Decimal(bridge - original).scaleb(-2):.2f}"])
+    except Exception as e:
+        print(f"Failed to calculate the as-of sweep: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+    return 0
+
+
+# Timed while profiling is enabled, see Profiler in bridge_in_service_profiling
+Profiler.register(AsOfSweep, "sweep", "as_of_sweep")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
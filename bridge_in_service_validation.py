@@ -0,0 +1,305 @@
+import argparse
+import csv
+import os
+import sys
+from datetime import datetime
+import numpy as np
+from bridge_in_service_WIP_3 import DateOperations, Verification
+from bridge_in_service_batch import RosterImport
+
+
+class ValidationReport:
+    """
+    Errors found in a roster, one entry per invalid cell, stored as three NumPy arrays.
+
+    rows holds the data row (0 is the first row after the header), fields the index of the column
+    in RosterValidation.FIELDS and codes the error code, see RosterValidation.MESSAGES.
+    Entries are sorted by row and then by field.
+    """
+
+    __slots__ = ("rows", "fields", "codes")
+
+    def __init__(self, rows, fields, codes):
+        self.rows = rows
+        self.fields = fields
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        """Yield (row, field, code) for each error."""
+        for row, field, code in zip(self.rows.tolist(), self.fields.tolist(), self.codes.tolist()):
+            yield row, RosterValidation.FIELDS[field], code
+
+    def messages(self):
+        """Yield (row, field, message) for each error, with the messages the Verification methods use."""
+        for row, field, code in self:
+            yield row, field, RosterValidation.MESSAGES[code]
+
+    def invalid_rows(self):
+        """Return the sorted data rows with at least one error."""
+        return np.unique(self.rows)
+
+
+class RosterValidation:
+    """
+    Column-wise replacement for running the Verification methods on every cell of a roster.
+
+    Whole columns are checked at once: IDs and dates are parsed from a character matrix of the
+    column and FTEs with a single float conversion. Values the fast parsers do not recognize
+    (for example non-ASCII digits) are passed to the Verification methods, so a value is only
+    valid here if it is valid there. Unlike BatchCalculation.build_employee, which stops at the
+    first problem, every invalid cell is reported.
+    """
+
+    FIELDS = ["Employee ID", "Most Recent Start Date", "FTE", "Period Start", "Period End", "FTE Change Date", "New FTE"]
+
+    INVALID_ID = 1
+    INVALID_DATE = 2
+    FUTURE_DATE = 3
+    RECENT_START_DATE = 4
+    INVALID_FTE = 5
+    FTE_OUT_OF_RANGE = 6
+    FUTURE_START_DATE = 7
+
+    MESSAGES = {
+        INVALID_ID: "Invalid ID. Please ensure it is 8 digits.",
+        INVALID_DATE: "Invalid date format. Please use MM/DD/YYYY.",
+        FUTURE_DATE: "Date must not be in the future.",
+        RECENT_START_DATE: "Start date must be at least 6 months ago.",
+        INVALID_FTE: "Invalid FTE value. FTE must be a number.",
+        FTE_OUT_OF_RANGE: "FTE must be between 0.75 and 1.0.",
+        FUTURE_START_DATE: "Start date cannot be in the future."
+    }
+
+    # Positions of the two slashes in M/D/YYYY, MM/D/YYYY, M/DD/YYYY and MM/DD/YYYY
+    DATE_LAYOUTS = [(1, 3), (2, 4), (1, 4), (2, 5)]
+    EPOCH = datetime(1970, 1, 1)
+
+    @staticmethod
+    def character_matrix(values, width):
+        """Return the characters of each value as a (len(values), width) matrix of code points, 0 past the end."""
+        text = np.array(values, dtype=str)
+        if len(text) == 0 or text.itemsize == 0:
+            return np.zeros((len(text), width), dtype=np.uint32)
+        chars = text.view(np.uint32).reshape(len(text), -1)
+        if chars.shape[1] < width:
+            chars = np.pad(chars, ((0, 0), (0, width - chars.shape[1])))
+        return chars
+
+    @staticmethod
+    def digits_value(digits):
+        """Return the number spelled by each row of a matrix of digit values."""
+        value = np.zeros(len(digits), dtype=np.int64)
+        for column in range(digits.shape[1]):
+            value = value * 10 + digits[:, column]
+        return value
+
+    @staticmethod
+    def verify_employee_ids(values):
+        """Return a boolean array, True where the ID is valid (8 digits, as Verification.verify_employee_id)."""
+        chars = RosterValidation.character_matrix(values, 9)
+        lengths = np.count_nonzero(chars, axis=1)
+        valid = (lengths == 8) & ((chars[:, :8] >= 48) & (chars[:, :8] <= 57)).all(axis=1)
+        # Non-ASCII digits also pass str.isdigit, leave those to Verification
+        for index in np.flatnonzero(~valid & (chars > 127).any(axis=1)).tolist():
+            valid[index] = Verification.verify_employee_id(values[index])[0]
+        return valid
+
+    @staticmethod
+    def parse_dates(values):
+        """
+        Parse MM/DD/YYYY dates like DateOperations.convert_to_datetime, one column at a time.
+
+        Returns:
+        tuple: (days, valid), the days since 1970-01-01 of each date and a boolean array, True where it parsed.
+        """
+        chars = RosterValidation.character_matrix(values, 10)
+        lengths = np.count_nonzero(chars, axis=1)
+        chars = chars[:, :10].astype(np.int64)
+        digit = (chars >= 48) & (chars <= 57)
+        slash = chars == 47
+        digits = chars - 48
+
+        year = np.zeros(len(values), dtype=np.int64)
+        month = np.zeros(len(values), dtype=np.int64)
+        day = np.zeros(len(values), dtype=np.int64)
+        matched = np.zeros(len(values), dtype=bool)
+        for first_slash, second_slash in RosterValidation.DATE_LAYOUTS:
+            length = second_slash + 5
+            digit_positions = [i for i in range(length) if i not in (first_slash, second_slash)]
+            layout = (lengths == length) & slash[:, first_slash] & slash[:, second_slash] & digit[:, digit_positions].all(axis=1)
+            month[layout] = RosterValidation.digits_value(digits[layout, :first_slash])
+            day[layout] = RosterValidation.digits_value(digits[layout, first_slash + 1:second_slash])
+            year[layout] = RosterValidation.digits_value(digits[layout, second_slash + 1:length])
+            matched |= layout
+
+        valid = matched & (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+        month_start = (np.maximum(year, 1) - 1970).astype("datetime64[Y]").astype("datetime64[M]") + np.clip(month - 1, 0, 11)
+        month_days = ((month_start + 1).astype("datetime64[D]") - month_start.astype("datetime64[D]")).astype(np.int64)
+        valid &= day <= month_days
+        days = month_start.astype("datetime64[D]").astype(np.int64) + day - 1
+
+        # strptime also accepts a few rarer spellings, such as a day padded with a space
+        for index in np.flatnonzero(~matched & (lengths > 0)).tolist():
+            date = DateOperations.convert_to_datetime(values[index])
+            if date is not None:
+                days[index] = (date - RosterValidation.EPOCH).days
+                valid[index] = True
+        return days, valid
+
+    @staticmethod
+    def parse_ftes(values):
+        """
+        Parse FTE values like Verification.verify_employee_fte.
+
+        Returns:
+        tuple: (fte, valid), the FTE values and a boolean array, True where the value is a number.
+        """
+        try:
+            # NumPy converts text with Python's float, so one bad value fails the whole column
+            return np.array(values, dtype=str).astype(np.float64), np.ones(len(values), dtype=bool)
+        except ValueError:
+            pass
+        fte = np.zeros(len(values), dtype=np.float64)
+        valid = np.ones(len(values), dtype=bool)
+        for index, value in enumerate(values):
+            try:
+                fte[index] = float(value)
+            except ValueError:
+                valid[index] = False
+        return fte, valid
+
+    @staticmethod
+    def date_errors(values, today, minimum_age_days=0):
+        """
+        Return the error code of each date in values (0 if valid). Dates after today are invalid,
+        and with minimum_age_days so are dates less than that many days before today. With
+        minimum_age_days the values are start dates, checked like Verification.verify_most_recent_start_date,
+        so future ones are FUTURE_START_DATE rather than FUTURE_DATE.
+        """
+        days, valid = RosterValidation.parse_dates(values)
+        codes = np.where(days > today - minimum_age_days, RosterValidation.RECENT_START_DATE, 0)
+        future_code = RosterValidation.FUTURE_START_DATE if minimum_age_days else RosterValidation.FUTURE_DATE
+        codes = np.where(days > today, future_code, codes)
+        return np.where(valid, codes, RosterValidation.INVALID_DATE)
+
+    @staticmethod
+    def fte_errors(values):
+        """Return the error code of each FTE in values (0 if valid)."""
+        fte, valid = RosterValidation.parse_ftes(values)
+        in_range = (fte >= 0.75) & (fte <= 1.0)
+        return np.where(~valid, RosterValidation.INVALID_FTE, np.where(~in_range, RosterValidation.FTE_OUT_OF_RANGE, 0))
+
+    @staticmethod
+    def validate_columns(columns, as_of_date=None):
+        """
+        Validate a roster given as columns, with the same rules as BatchCalculation.build_employee.
+
+        Parameters:
+        columns (dict): Column title -> list of cell texts (see RosterImport.cell_to_text), one per row.
+                        Missing columns are treated as empty.
+        as_of_date (datetime): Date to validate as of. Defaults to today.
+
+        Returns:
+        ValidationReport: One entry per invalid cell.
+        """
+        row_count = max((len(values) for values in columns.values()), default=0)
+
+        def column(title):
+            return np.array(columns.get(title) or [""] * row_count, dtype=object)
+
+        as_of_date = as_of_date or DateOperations.get_todays_date()
+        today = (as_of_date.replace(hour=0, minute=0, second=0, microsecond=0) - RosterValidation.EPOCH).days
+        field = {title: index for index, title in enumerate(RosterValidation.FIELDS)}
+        found = []  # (rows, field, codes)
+
+        def add(title, rows, codes):
+            invalid = codes != 0
+            found.append((rows[invalid], np.full(np.count_nonzero(invalid), field[title]), codes[invalid]))
+
+        all_rows = np.arange(row_count)
+        ids = column("Employee ID")
+        add("Employee ID", all_rows, np.where(RosterValidation.verify_employee_ids(ids.tolist()), 0, RosterValidation.INVALID_ID))
+
+        # The first row of each employee carries the employee details
+        first_rows = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1]))) if row_count else all_rows
+        # Same six months as Verification.verify_most_recent_start_date
+        add("Most Recent Start Date", first_rows, RosterValidation.date_errors(column("Most Recent Start Date")[first_rows].tolist(), today, 182))
+        add("FTE", first_rows, RosterValidation.fte_errors(column("FTE")[first_rows].tolist()))
+
+        # A period needs both dates when either is given; periods are not checked against today
+        period_start, period_end = column("Period Start"), column("Period End")
+        period_rows = np.flatnonzero((period_start != "") | (period_end != ""))
+        for title, values in (("Period Start", period_start), ("Period End", period_end)):
+            _, valid = RosterValidation.parse_dates(values[period_rows].tolist())
+            add(title, period_rows, np.where(valid, 0, RosterValidation.INVALID_DATE))
+
+        change_date, new_fte = column("FTE Change Date"), column("New FTE")
+        change_rows = np.flatnonzero((change_date != "") | (new_fte != ""))
+        add("FTE Change Date", change_rows, RosterValidation.date_errors(change_date[change_rows].tolist(), today))
+        add("New FTE", change_rows, RosterValidation.fte_errors(new_fte[change_rows].tolist()))
+
+        rows = np.concatenate([entry[0] for entry in found]).astype(np.int64)
+        fields = np.concatenate([entry[1] for entry in found]).astype(np.int8)
+        codes = np.concatenate([entry[2] for entry in found]).astype(np.int8)
+        order = np.lexsort((fields, rows))
+        return ValidationReport(rows[order], fields[order], codes[order])
+
+    @staticmethod
+    def read_columns(file_path):
+        """Read a CSV or XLSX roster into columns of cell texts, keyed by column title."""
+        columns = {title: [] for title in RosterImport.COLUMNS}
+        for row in RosterImport.read_rows(file_path):
+            for title, values in columns.items():
+                values.append(RosterImport.cell_to_text(row.get(title)))
+        return columns
+
+    @staticmethod
+    def try_validate_roster(roster_path, output_file, as_of_date=None):
+        """
+        Validate a roster and write one CSV line per invalid cell to output_file.
+
+        Returns:
+        int: The number of errors found, or None if the roster could not be validated.
+        """
+        try:
+            report = RosterValidation.validate_columns(RosterValidation.read_columns(roster_path), as_of_date)
+            writer = csv.writer(output_file)
+            writer.writerow(["Row", "Field", "Code", "Message"])
+            for row, field, code in report:
+                # Row 1 is the header, as numbered in Excel
+                writer.writerow([row + 2, field, code, RosterValidation.MESSAGES[code]])
+            print(f"Found {len(report)} errors in {len(report.invalid_rows())} rows.", file=sys.stderr)
+            return len(report)
+        except Exception as e:
+            print(f"Failed to validate roster: {e}", file=sys.stderr)
+            return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check every row of a roster before a batch run or import.")
+    parser.add_argument("roster", help="CSV or XLSX roster with the columns: " + ", ".join(RosterImport.COLUMNS))
+    parser.add_argument("output", nargs="?", default="-", help="CSV file to write the errors to (default: standard output)")
+    parser.add_argument("--as-of", help="Validate as of this date (MM/DD/YYYY) instead of today")
+    args = parser.parse_args(argv)
+    if os.path.splitext(args.roster)[1].lower() in RosterImport.STORE_EXTENSIONS:
+        parser.error("Employee stores only hold employees that were valid when imported.")
+
+    as_of_date = None
+    if args.as_of:
+        as_of_date = DateOperations.convert_to_datetime(args.as_of)
+        if as_of_date is None:
+            parser.error("Invalid --as-of date. Please use MM/DD/YYYY.")
+
+    if args.output == "-":
+        errors = RosterValidation.try_validate_roster(args.roster, sys.stdout, as_of_date)
+    else:
+        with open(args.output, "w", newline="", encoding="utf-8") as output_file:
+            errors = RosterValidation.try_validate_roster(args.roster, output_file, as_of_date)
+    return 0 if errors == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())